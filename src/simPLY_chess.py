@@ -18,12 +18,31 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/> #
 #########################################################################
 
+import argparse
+import concurrent.futures
+import contextlib
+import copy
 import itertools
+import json
+import mmap
+import multiprocessing
+import os
 import pathlib
 import random
+import re
 import struct
 import sys
+import threading
 import time
+from array import array
+from collections.abc import Callable, Iterator
+from multiprocessing import shared_memory
+from typing import NamedTuple
+
+try:
+    import numpy
+except ImportError:  # only needed by evaluate_batch() and the evaluation tuner
+    numpy = None
 
 NAME: str = "simPLY_chess"
 AUTHOR: str = "andrewharabor"
@@ -59,7 +78,7 @@ PIECE_DIRECTIONS: dict[str, list[int]] = {
 # 10 x 12 board for easy detection of moves that go off the edge of the board
 # Uppercase letters are used for the current player's pieces and lowercase letters are used for the opponent's pieces
 # Periods are used for empty squares and spaces are used for off-board squares
-INITIAL_POSITION: str = (
+INITIAL_BOARD: str = (
     "         \n"  # 0 - 9
     "         \n"  # 10 - 19
     " rnbqkbnr\n"  # 20 - 29
@@ -73,18 +92,133 @@ INITIAL_POSITION: str = (
     "         \n"  # 100 - 109
     "         \n"  # 110 - 119
 )
-INITIAL_CASTLING: list[bool] = [True, True]  # [queenside, kingside]
-INITIAL_OPPONENT_CASTLING: list[bool] = [True, True]  # [queenside, kingside]
+INITIAL_CASTLING: int = 15  # every castling right
 INITIAL_EN_PASSANT: int = 0  # square where en passant is possible for the current player
 INITIAL_KING_PASSANT: int = 0  # square the king "passes through" when castling (the square the rook is moved to), used to detect castling through check
 INITIAL_COLOR: str = "w"  # the current player's color
 
+# Castling rights are bits of one integer, stored from the current player's point of view like the board: the bit of
+# a rook on h1, a1, h8 or a8 (so K = 1, Q = 2, k = 4 and q = 8 like the bitboard backend when white is to move)
+CASTLING_H1: int = 1
+CASTLING_A1: int = 2
+CASTLING_H8: int = 4
+CASTLING_A8: int = 8
+CASTLING_LETTERS: dict[str, int] = {"K": CASTLING_H1, "Q": CASTLING_A1, "k": CASTLING_H8, "q": CASTLING_A8}  # FEN letters as seen by white
+CASTLING_MASKS: list[int] = [15] * 120  # castling rights kept when a move starts or ends on a square
+CASTLING_MASKS[H1], CASTLING_MASKS[A1], CASTLING_MASKS[H8], CASTLING_MASKS[A8] = 14, 13, 11, 7
+# Rotating the board turns the a1 rook into the h8 rook and the h1 rook into the a8 rook, which reverses the bits
+ROTATED_CASTLING: list[int] = [sum(1 << (3 - bit) for bit in range(4) if rights >> bit & 1) for rights in range(16)]
+
+
+class Position(NamedTuple):
+    """Everything known about a position, always from the current player's point of view (the board is rotated when
+    black is to move). Positions are immutable, so making a move builds a new one instead of copying the old one."""
+    board: str  # 10 x 12 board like INITIAL_BOARD
+    castling: int  # castling rights, see CASTLING_H1
+    en_passant: int  # square where en passant is possible for the current player, 0 if there is none
+    king_passant: int  # square the king passed through if the last move was castling, 0 otherwise
+    color: str  # the current player's color
+    key: int  # Zobrist key, updated incrementally by make_move() and rotate_position()
+    scores: tuple[int, int, int]  # packed scores and game phase, see position_scores()
+
+
 # Transposition table, used to store previously calculated positions and keep track of the best move
-TRANSPOSITION_TABLE: dict[int, tuple[tuple[int, int, str, str], int, int]] = {}  # format is {zobrist_key: (best_move, depth, score)}
+# It is a fixed-size array of buckets, each holding two entries of two 64-bit slots (the Zobrist key and the packed data):
+# the first entry is depth-preferred and the second is always replaced. The data packs the best move (20 bits), depth
+# (8 bits), bound type (2 bits), age (6 bits) and score (28 bits, offset to be non-negative) into one integer.
+# The key slot holds the key XORed with the data so that entries torn by concurrent writes of helper processes are
+# detected and ignored instead of needing a lock.
+TRANSPOSITION_TABLE: array | memoryview = array("Q")  # allocated by resize_transposition_table()
+TRANSPOSITION_MEMORY: shared_memory.SharedMemory | None = None  # backs the table when helper processes share it
+HASH_SIZE: int = 16  # size of the transposition table in megabytes, set with the "Hash" UCI option
+MIN_HASH_SIZE: int = 1
+MAX_HASH_SIZE: int = 4096
+BUCKET_SLOTS: int = 4
+EXACT_BOUND: int = 1  # the score is exact (a principal variation node)
+LOWER_BOUND: int = 2  # the score is at least the stored value (a beta cutoff)
+UPPER_BOUND: int = 3  # the score is at most the stored value (no move raised alpha)
+SCORE_OFFSET: int = 1 << 27
+MOVE_CAPTURED_PIECES: list[str] = ["", ".", "p", "n", "b", "r", "q", "k"]  # piece captured by a packed move, "" for the null move
+MOVE_PROMOTION_PIECES: list[str] = ["", "N", "B", "R", "Q"]
+
+# Evaluation cache, a direct-mapped table of static evaluations indexed by the Zobrist key
+# Each entry is two 64-bit slots: the key and the score (offset to be non-negative like in the transposition table)
+EVALUATION_CACHE: array = array("Q")  # allocated by resize_evaluation_cache()
+EVALUATION_CACHE_SIZE: int = 4  # size in megabytes, set with the "EvalCache" UCI option
+MIN_EVALUATION_CACHE_SIZE: int = 1
+MAX_EVALUATION_CACHE_SIZE: int = 1024
+
+# Batch evaluation, positions are encoded as one int8 code per square: 0 for an empty square, 1-6 for the side-to-move's
+# pieces and 7-12 for the opponent's pieces (in the order of BATCH_PIECES)
+BATCH_PIECES: str = ".PNBRQKpnbrqk"
+BATCH_CODES: bytes = bytes.maketrans(b"PNBRQKpnbrqk12345678", bytes(range(1, 13)) + bytes(8))  # FEN characters to piece codes
+BATCH_RUN_LENGTHS: bytes = bytes.maketrans(b"PNBRQKpnbrqk12345678/", bytes(12 * [1]) + bytes(range(1, 9)) + bytes(1))  # squares per FEN character
+BATCH_FIELD_BITS: int = 21  # bits of each of the midgame score, endgame score and phase packed together by batch_evaluation_table()
+BATCH_CHUNK_SIZE: int = 1 << 12  # positions evaluated at once, keeps the intermediate arrays in the CPU cache
+
+# Evaluation tuning, the "tune" command line tool fits the piece values, piece square tables and tropism values to a
+# corpus of positions labelled with game results and writes them to a JSON file, which the engine only uses when it is
+# named by the "EvalFile" UCI option or the --eval-file command line flag
+EVALUATION_PARAMETERS_PATH: pathlib.Path = pathlib.Path(__file__).resolve().parent / "evaluation_parameters.json"  # default output of "tune"
+EVALUATION_PARAMETERS_FILE: str = ""  # tuned parameters the evaluation uses instead of the built-in ones, empty for none
+EVALUATION_PARAMETER_NAMES: list[str] = ["MIDGAME_PIECE_VALUES", "ENDGAME_PIECE_VALUES", "MIDGAME_TROPISM_VALUES", "ENDGAME_TROPISM_VALUES", "MIDGAME_PIECE_SQUARE_TABLES", "ENDGAME_PIECE_SQUARE_TABLES"]
+TUNING_PIECES: str = "PNBRQ"  # pieces whose value and tropism are tuned, the king's cancel out since both sides have one
+TUNING_RESULT_PATTERN: re.Pattern = re.compile(r"(1-0|0-1|1/2-1/2|[01]\.\d*)\W*$")  # game result at the end of a corpus line
+TUNING_RESULTS: dict[str, float] = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}  # from white's point of view
+TUNING_EPOCHS: int = 1000
+TUNING_LEARNING_RATE: float = 1.0  # centipawns, the step size of the Adam optimizer
+
+# Move ordering tables for quiet moves, filled on beta cutoffs and aged between searches
+KILLER_MOVES: list[list[tuple[int, int, str, str]]] = []  # format is [[killer_move, killer_move]] by ply, reset for every search
+HISTORY_TABLE: list[int] = [0] * 120 * 120  # butterfly table, format is [start_square * 120 + end_square] = score
+COUNTER_MOVES: list[tuple[int, int, str, str]] = [(0, 0, "", "")] * 120 * 120  # best reply, indexed like the history table by the opponent's last move
 
 # Repetition table, used to detect draw by reptition
 REPETITION_TABLE: dict[int, int] = {} # format is {zobrist_key: count}
 
+# Lazy SMP, helper processes search the same position as the main search and share the transposition table
+THREAD_COUNT: int = 1  # number of searching processes including the main one, set with the "Threads" UCI option
+MAX_THREAD_COUNT: int = 128
+MULTIPROCESSING_CONTEXT = multiprocessing.get_context("spawn")  # helpers start from a clean interpreter instead of forking the search thread
+HELPERS: list[tuple[multiprocessing.Process, multiprocessing.Queue]] = []  # format is [(process, task_queue)]
+HELPER_RESULT_SLOTS: int = 4  # nodes, completed depth, score and packed best move of each helper
+
+# Root splitting, fixed-depth searches can instead spread the root moves over a pool of processes
+ROOT_SPLIT: bool = False  # set with the "RootSplit" UCI option
+ROOT_SPLIT_EXECUTOR: concurrent.futures.ProcessPoolExecutor | None = None  # started on the first split search
+
+# Selective search, each technique can be switched off with the UCI option of the same name to compare "bench" node
+# counts and time to depth with and without it
+SELECTIVE_SEARCH: dict[str, bool] = {"NullMove": True, "LateMoveReductions": True, "Futility": True, "Razoring": True}
+NULL_MOVE_REDUCTION: int = 2
+NULL_MOVE_MIN_DEPTH: int = 3
+LMR_MIN_DEPTH: int = 3
+LMR_FULL_DEPTH_MOVES: int = 3  # legal moves searched to full depth before quiet moves are reduced
+FUTILITY_MARGINS: list[int] = [0, 200, 500]  # by remaining depth, quiet moves at frontier nodes can't raise alpha by more
+RAZOR_MARGINS: list[int] = [0, 300, 600]  # by remaining depth, nodes this far below alpha are resolved by quiesce()
+
+# Aspiration windows, iterations after the first search a window around the previous score which is widened when the
+# score falls outside of it
+ASPIRATION_WINDOW: int = 50
+ASPIRATION_GROWTH: int = 4  # factor the window is widened by after a failed search
+MAX_ASPIRATION_WINDOW: int = 1000  # wider windows are replaced by the full window
+
+# Time management, the clock is only read every few nodes and a search has a soft limit (no new iteration is started
+# after it) and a hard limit (the search is stopped at it)
+CLOCK_CHECK_INTERVAL: int = 256  # nodes between two reads of the clock
+MOVE_OVERHEAD: int = 30  # milliseconds kept in reserve for communication delays, set with the "Move Overhead" UCI option
+MAX_MOVE_OVERHEAD: int = 5000
+MIN_TIME_LIMIT: float = 0.01  # seconds, the time and node limits are only checked once the first iteration is done anyway
+DEFAULT_MOVES_TO_GO: int = 20  # moves the remaining time is spread over when "movestogo" isn't given
+HARD_TIME_FACTOR: float = 3  # the hard limit can be this many times the soft limit
+MAX_TIME_FRACTION: float = 0.8  # fraction of the remaining time a single move can use at most
+DEFAULT_BRANCHING_FACTOR: float = 4  # used to predict the cost of the second iteration
+
+# Searches run on a worker thread so that the UCI loop can keep reading commands like "stop" and "isready"
+SEARCH_STOP: threading.Event = threading.Event()  # set to end the current search as soon as possible
+SEARCH_RELEASE: threading.Event = threading.Event()  # cleared while the best move has to be held back ("go infinite" and "go ponder")
+OUTPUT_LOCK: threading.Lock = threading.Lock()  # keeps responses from both threads on separate lines
+
 # Piece values, piece square tables, and tropism values for the middlegame and endgame
 # Used to evaluate the position in terms of material and piece placement, and king safety
 MIDGAME_PAWN_VALUE: int = 100  # all values are in centipawns
@@ -274,6 +408,9 @@ ENDGAME_PIECE_SQUARE_TABLES: dict[str, list[int]] = {
     "K": ENDGAME_KING_TABLE,
 }
 
+# Copies of the built-in values (the tables above are padded by initialize_evaluation()) to go back to from tuned ones
+BUILT_IN_EVALUATION_PARAMETERS: dict[str, dict] = copy.deepcopy({name: globals()[name] for name in EVALUATION_PARAMETER_NAMES})
+
 MOP_UP_SCORE: int = ENDGAME_PAWN_VALUE * 2 # used to encourage kings to be closer to each other if winning an endgame position
 
 # Checkmate scores
@@ -287,6 +424,18 @@ ROOK_PHASE: int = 2
 QUEEN_PHASE: int = 4
 TOTAL_PHASE: int = 4 * KNIGHT_PHASE + 4 * BISHOP_PHASE + 4 * ROOK_PHASE + 2 * QUEEN_PHASE
 
+PIECE_PHASES: dict[str, int] = {
+    "P": 0, "p": 0,
+    "N": KNIGHT_PHASE, "n": KNIGHT_PHASE,
+    "B": BISHOP_PHASE, "b": BISHOP_PHASE,
+    "R": ROOK_PHASE, "r": ROOK_PHASE,
+    "Q": QUEEN_PHASE, "q": QUEEN_PHASE,
+    "K": 0, "k": 0,
+}
+
+# Manhattan distances between every pair of squares, used for king tropism and the mop-up bonus
+MANHATTAN_DISTANCES: list[list[int]] = [[abs(square1 % 10 - square2 % 10) + abs(square1 // 10 - square2 // 10) for square2 in range(120)] for square1 in range(120)]
+
 # Hashing and PolyGlot opening book constants
 HASH_VALUES: list[int] = [
     0x9D39247E33776D41, 0x2AF7398005AAA5C7, 0x44DB015024623547, 0x9C15F73E62A76AE2,
@@ -502,6 +651,30 @@ PIECE_ENCODINGS: dict[str, int] = {
     "K": 11
 }
 
+# Zobrist keys for each piece on each square of our 10x12 board, indexed by the side to move since the board is rotated
+# when black is to move, used to update the Zobrist key of a position incrementally as moves are made
+ZOBRIST_PIECE_KEYS: dict[str, dict[str, list[int]]] = {
+    color: {
+        piece: [
+            HASH_VALUES[(64 * PIECE_ENCODINGS[piece if color == "w" else piece.swapcase()]) + (8 * (9 - (real_square // 10))) + (real_square % 10) - 1]
+            if A8 <= square <= H1 and 1 <= square % 10 <= 8 else 0
+            for square, real_square in ((square, square if color == "w" else 119 - square) for square in range(120))
+        ]
+        for piece in PIECE_ENCODINGS
+    }
+    for color in "wb"
+}
+ZOBRIST_EN_PASSANT_KEYS: dict[str, list[int]] = {color: [HASH_VALUES[772 + ((square if color == "w" else 119 - square) % 10) - 1] for square in range(120)] for color in "wb"}
+ZOBRIST_CASTLING_KEYS: dict[str, list[int]] = {  # format is {color: [key of the castling rights]} with the rights seen from the side to move
+    color: [
+        (HASH_VALUES[768 + h1_index] if rights & CASTLING_H1 else 0) ^ (HASH_VALUES[768 + a1_index] if rights & CASTLING_A1 else 0)
+        ^ (HASH_VALUES[768 + h8_index] if rights & CASTLING_H8 else 0) ^ (HASH_VALUES[768 + a8_index] if rights & CASTLING_A8 else 0)
+        for rights in range(16)
+    ]
+    for color, (h1_index, a1_index, h8_index, a8_index) in (("w", (0, 1, 2, 3)), ("b", (3, 2, 1, 0)))
+}
+ZOBRIST_TURN_KEY: int = HASH_VALUES[780]
+
 DECODED_PROMOTION_PIECES: dict[int, str] = {
     0: "",
     1: "N",
@@ -510,6 +683,20 @@ DECODED_PROMOTION_PIECES: dict[int, str] = {
     4: "Q",
 }
 
+BOOK_DIRECTORY: pathlib.Path = pathlib.Path(__file__).resolve().parent / "opening_books"
+BOOK_NAMES: list[str] = ["main5", "main6", "main7"]  # books probed by the engine, any of the shipped books can be added
+
+BOOK_ENTRY: struct.Struct = struct.Struct(">QHHI")  # PolyGlot entry format: key, move, weight, learn
+BOOK_KEY: struct.Struct = struct.Struct(">Q")
+
+# Compiled books merge several PolyGlot books into one file sorted by key (and by weight within a key), with moves
+# already decoded into our 10x12 representation from white's point of view and the weights of every book combined
+COMPILED_BOOK_PATH: pathlib.Path = BOOK_DIRECTORY / "compiled.book"
+COMPILED_BOOK_ENTRY: struct.Struct = struct.Struct(">QBBBxI")  # key, start square, end square, encoded promotion piece, weight
+
+OPENING_BOOKS: list[mmap.mmap] = []  # loaded by load_opening_books()
+COMPILED_BOOK: mmap.mmap | None = None
+
 UNICODE_PIECE_SYMBOLS = {
     "R": "♖", "r": "♜",
     "N": "♘", "n": "♞",
@@ -519,128 +706,635 @@ UNICODE_PIECE_SYMBOLS = {
     "P": "♙", "p": "♟",
 }
 
+# Optional bitboard backend for perft and divide, selected with the "PerftBackend" UCI option (the search always uses
+# the 10x12 string board)
+# Bitboards are 64-bit integers always seen from white's point of view (a1 = bit 0, h8 = bit 63), one for each piece
+# indexed like PIECE_ENCODINGS so white pieces have odd indexes and black pieces have even indexes
+BOARD_BACKENDS: list[str] = ["string", "bitboard"]
+BOARD_BACKEND: str = "string"  # only used by perft and divide
+
+BITBOARD_KNIGHT_STEPS: list[tuple[int, int]] = [(2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2), (1, -2), (2, -1)]  # (rank step, file step)
+BITBOARD_KING_STEPS: list[tuple[int, int]] = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+BITBOARD_DIRECTIONS: list[tuple[int, int]] = [(1, 0), (1, 1), (1, -1), (0, 1), (-1, 0), (-1, -1), (-1, 1), (0, -1)]  # the first four increase the square index
+BITBOARD_BISHOP_DIRECTIONS: list[int] = [1, 2, 5, 6]  # indexes into BITBOARD_DIRECTIONS
+BITBOARD_ROOK_DIRECTIONS: list[int] = [0, 3, 4, 7]
+
+
+def bitboard_steps(square: int, steps: list[tuple[int, int]]) -> int:
+    """Returns the bitboard of the squares one step away from the given square, ignoring steps that leave the board."""
+    rank, file = divmod(square, 8)
+    return sum(1 << ((rank + rank_step) * 8 + file + file_step) for rank_step, file_step in steps if 0 <= rank + rank_step < 8 and 0 <= file + file_step < 8)
+
+
+BITBOARD_KNIGHT_ATTACKS: list[int] = [bitboard_steps(square, BITBOARD_KNIGHT_STEPS) for square in range(64)]
+BITBOARD_KING_ATTACKS: list[int] = [bitboard_steps(square, BITBOARD_KING_STEPS) for square in range(64)]
+BITBOARD_PAWN_ATTACKS: list[list[int]] = [  # indexed by the parity of the pawn's piece index: [black pawns, white pawns]
+    [bitboard_steps(square, [(-1, -1), (-1, 1)]) for square in range(64)],
+    [bitboard_steps(square, [(1, -1), (1, 1)]) for square in range(64)],
+]
+BITBOARD_RAYS: list[list[int]] = [  # every square reached from a square in a direction on an empty board
+    [sum(bitboard_steps(square, [(rank_step * distance, file_step * distance)]) for distance in range(1, 8)) for square in range(64)]
+    for rank_step, file_step in BITBOARD_DIRECTIONS
+]
+BITBOARD_CASTLING_MASKS: list[int] = [15] * 64  # castling rights (K = 1, Q = 2, k = 4, q = 8) kept when a move touches a square
+BITBOARD_CASTLING_MASKS[0], BITBOARD_CASTLING_MASKS[4], BITBOARD_CASTLING_MASKS[7] = 13, 12, 14
+BITBOARD_CASTLING_MASKS[56], BITBOARD_CASTLING_MASKS[60], BITBOARD_CASTLING_MASKS[63] = 7, 3, 11
+
+# Standard perft positions with their reference leaf node counts for depths 1, 2, 3, ...
+# See https://www.chessprogramming.org/Perft_Results
+PERFT_SUITE: list[tuple[str, list[int]]] = [
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", [20, 400, 8902, 197281, 4865609]),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4085603]),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1", [6, 264, 9467, 422333]),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+    ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890, 3894594]),
+]
+PERFT_CACHE: dict[tuple, int] = {}  # subtree counts of the perft being run, see perft()
+
+# Search statistics, only collected while the "Stats" UCI option is enabled or a "StatsFile" is set. The counters are
+# updated where the counted events happen, each behind a check of COLLECT_STATISTICS.
+STATISTICS_ENABLED: bool = False
+STATISTICS_FILE: str = ""  # JSON lines file each search appends its statistics to
+COLLECT_STATISTICS: bool = False  # set by configure_statistics()
+STATISTICS_COUNTERS: list[str] = ["main_nodes", "quiescence_nodes", "tt_probes", "tt_hits", "tt_cutoffs", "beta_cutoffs", "first_move_cutoffs", "movegen_calls", "evaluations", "eval_cache_misses", "legality_checks"]
+STATISTICS: dict[str, int] = dict.fromkeys(STATISTICS_COUNTERS, 0)  # counters of the last search
+STATISTICS_ITERATIONS: list[tuple[int, int]] = []  # format is [(depth, nodes)] for each completed iteration of the last search
+STATISTICS_SUMMARY: dict = {}  # statistics_summary() of the last search, taken as soon as it ends
+
+# Positions searched by the "bench" command, the total node count is a signature of the search that only changes when
+# the search itself does (with a single thread), while the nodes per second measure the engine's speed
+BENCH_DEPTH: int = 3
+BENCH_POSITIONS: list[str] = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 10",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 11",
+    "4rrk1/pp1n3p/3q2pQ/2p1pb2/2PP4/2P3N1/P2B2PP/4RRK1 b - - 7 19",
+    "rq3rk1/ppp2ppp/1bnpb3/3N2B1/3NP3/7P/PPPQ1PP1/2KR3R w - - 7 14",
+    "r1bq1r1k/1pp1n1pp/1p1p4/4p2Q/4Pp2/1BNP4/PPP2PPP/3R1RK1 w - - 2 14",
+    "r3r1k1/2p2ppp/p1p1bn2/8/1q2P3/2NPQN2/PPP3PP/R4RK1 b - - 2 15",
+    "r1bbk1nr/pp3p1p/2n5/1N4p1/2Np1B2/8/PPP2PPP/2KR1B1R w kq - 0 13",
+    "r1bq1rk1/ppp1nppp/4n3/3p3Q/3P4/1BP1B3/PP1N2PP/R4RK1 w - - 1 16",
+    "4r1k1/r1q2ppp/ppp2n2/4P3/5Rb1/1N1BQ3/PPP3PP/R5K1 w - - 1 17",
+    "2rqkb1r/ppp2p2/2npb1p1/1N1Nn2p/2P1PP2/8/PP2B1PP/R1BQK2R b KQ - 0 11",
+    "r1bq1r1k/b1p1npp1/p2p3p/1p6/3PP3/1B2NN2/PP3PPP/R2Q1RK1 w - - 1 16",
+    "3r1rk1/p5pp/bpp1pp2/8/q1PP1P2/b3P3/P2NQRPP/1R2B1K1 b - - 6 22",
+    "r1q2rk1/2p1bppp/2Pp4/p6b/Q1PNp3/4B3/PP1R1PPP/2K4R w - - 2 18",
+    "4k2r/1pb2ppp/1p2p3/1R1p4/3P4/2r1PN2/P4PPP/1R4K1 b - - 3 22",
+    "3q2k1/pb3p1p/4pbp1/2r5/PpN2N2/1P2P2P/5PP1/Q2R2K1 b - - 4 26",
+    "6k1/6p1/6Pp/ppp5/3pn2P/1P3K2/1PP2P2/8 b - - 3 54",
+    "8/8/8/8/5kp1/P7/8/1K1N4 w - - 0 1",
+    "8/8/8/5N2/8/p7/8/2NK3k w - - 0 1",
+    "8/3k4/8/8/8/4B3/4KN2/8 w - - 0 1",
+    "8/8/1P6/5pr1/8/4R3/7k/2K5 w - - 0 1",
+    "8/2p4P/8/kr6/6R1/8/8/1K6 w - - 0 1",
+    "8/8/3P3k/8/1p6/8/1P6/1K3n2 b - - 0 1",
+    "8/R7/2q5/8/6k1/8/1P5p/K6R w - - 0 124",
+    "6k1/3b3r/1p1p4/p1n2p2/1PPNpP1q/P3Q1p1/1R1RB1P1/5K2 b - - 0 1",
+    "r2r1n2/pp2bk2/2p1p2p/3q4/3PN1QP/2P3R1/P4PP1/5RK1 w - - 0 1",
+    "8/8/8/8/8/5k2/6p1/6K1 w - - 0 1",
+    "7k/7P/6K1/8/8/3B4/8/8 w - - 0 1",
+    "2r2rk1/1bqnbpp1/1p1ppn1p/pP6/N1P1P3/P2B1N1P/1B2QPP1/R2R2K1 b - - 0 1",
+    "rnbqkb1r/pp1p1ppp/4pn2/2p5/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 0 4",
+    "r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3",
+    "rnbqkbnr/pp2pppp/3p4/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 0 3",
+    "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 1 5",
+    "rnbq1rk1/ppp1ppbp/3p1np1/8/2PPP3/2N2N2/PP2BPPP/R1BQK2R b KQ - 3 6",
+    "r1bq1rk1/pp2ppbp/2np1np1/8/3NP3/2N1BP2/PPPQ2PP/R3KB1R w KQ - 3 9",
+    "rnbqk2r/ppp1bppp/4pn2/3p2B1/2PP4/2N5/PP2PPPP/R2QKBNR w KQkq - 4 5",
+    "r4rk1/pp3ppp/2n1b3/q1pp2B1/8/P1Q2NP1/1PP1PP1P/2KR3R w - - 0 15",
+    "r1b2rk1/pp1p1pp1/1b1p2B1/n1qQ2p1/8/5N2/P3RPPP/4R1K1 w - - 0 1",
+    "r1bqkb1r/pp3ppp/2nppn2/8/3NP3/2N5/PPP2PPP/R1BQKB1R w KQkq - 0 6",
+    "rnbqkb1r/ppp2ppp/4pn2/3p4/2PP4/5N2/PP2PPPP/RNBQKB1R w KQkq - 0 4",
+]
+
 ###############
 # BOARD LOGIC #
 ###############
 
-def generate_moves(position: str, castling: list[bool], en_passant: int) -> list[tuple[int, int, str, str]]:
+def generate_moves(position: Position) -> list[tuple[int, int, str, str]]:
     """Generates all pseudo-legal moves for a given position. Moves are represented as tuples:
     (start_square, end_square, piece_captured, promotion_piece)"""
+    board: str = position.board
+    en_passant: int = position.en_passant
+    move_list: list[tuple[int, int, str, str]] = generate_captures(board) + generate_quiet_moves(board, position.castling, en_passant)
+    phase: int = game_phase(board)
+    move_list.sort(key=lambda move: evaluate_move(move, board, en_passant, phase), reverse=True)  # sort moves by basic evaluation
+    return move_list
+
+
+def generate_captures(board: str) -> list[tuple[int, int, str, str]]:
+    """Generates all pseudo-legal captures (other than en passant) for a given position, ordered by most valuable victim
+    and then least valuable attacker (MVV-LVA)."""
+    if COLLECT_STATISTICS:
+        STATISTICS["movegen_calls"] += 1
+    move_list: list[tuple[int, int, str, str]] = []
+    for start_square, piece_moved in enumerate(board):
+        if not piece_moved.isupper():  # piece is not current player's
+            continue
+        if piece_moved == "P":
+            for end_square in (start_square + NORTH + WEST, start_square + NORTH + EAST):
+                piece_captured: str = board[end_square]
+                if not piece_captured.islower():
+                    continue
+                if A8 <= end_square <= H8:  # pawn promotion
+                    for promotion_piece in "QRBN":
+                        move_list.append((start_square, end_square, piece_captured, promotion_piece))
+                else:
+                    move_list.append((start_square, end_square, piece_captured, ""))
+            continue
+        sliding: bool = piece_moved not in "NK"
+        for direction in PIECE_DIRECTIONS[piece_moved]:
+            end_square: int = start_square + direction
+            if sliding:
+                while board[end_square] == ".":
+                    end_square += direction
+            if board[end_square].islower():
+                move_list.append((start_square, end_square, board[end_square], ""))
+    move_list.sort(key=lambda move: (MIDGAME_PIECE_VALUES[move[2].upper()], -MIDGAME_PIECE_VALUES[board[move[0]]]), reverse=True)
+    return move_list
+
+
+def generate_quiet_moves(board: str, castling: int, en_passant: int) -> list[tuple[int, int, str, str]]:
+    """Generates all pseudo-legal moves that don't capture a piece for a given position, including castling,
+    promotions and en passant captures (since the pawn lands on an empty square)."""
+    if COLLECT_STATISTICS:
+        STATISTICS["movegen_calls"] += 1
     move_list: list[tuple[int, int, str, str]] = []
-    for start_square in range(len(position)):
-        if not position[start_square].isupper():  # piece is not current player's
+    for start_square, piece_moved in enumerate(board):
+        if not piece_moved.isupper():  # piece is not current player's
             continue
-        piece_moved: str = position[start_square]
         for direction in PIECE_DIRECTIONS[piece_moved]:
             for end_square in itertools.count(start_square + direction, direction):
-                piece_captured: str = position[end_square]
-                if piece_captured.isspace() or piece_captured.isupper():  # off the board or ally piece
+                if board[end_square] != ".":  # off the board, ally piece or capture
                     break
                 if piece_moved == "P":
-                    if direction in [NORTH, NORTH + NORTH] and piece_captured != ".":  # pawn push onto occupied square
+                    if direction == NORTH + NORTH and (start_square < A1 + NORTH or board[start_square + NORTH] != "."):  # double pawn push from invalid rank
                         break
-                    if direction == NORTH + NORTH and (start_square < A1 + NORTH or position[start_square + NORTH] != "."):  # double pawn push from invalid rank
-                        break
-                    if direction in [NORTH + WEST, NORTH + EAST] and piece_captured == "." and end_square + SOUTH != en_passant:  # invalid en passant capture
+                    if (direction == NORTH + WEST or direction == NORTH + EAST) and end_square != en_passant:  # invalid en passant capture
                         break
                     if A8 <= end_square <= H8:  # pawn promotion
                         for promotion_piece in "QRBN":
-                            move_list.append((start_square, end_square, piece_captured, promotion_piece))
+                            move_list.append((start_square, end_square, ".", promotion_piece))
                         break
-                move_list.append((start_square, end_square, piece_captured, ""))
-                if piece_moved in "PNK" or piece_captured.islower():  # non-sliding piece or capture
+                move_list.append((start_square, end_square, ".", ""))
+                if piece_moved in "PNK":  # non-sliding piece
                     break
-                if start_square == A1 and position[end_square + EAST] == "K" and castling[0]:  # the piece is a rook on a1, and the king is on e1 with empty squares in between, and queenside castling is allowed
-                    move_list.append((end_square + EAST, end_square + WEST, piece_captured, ""))
-                if  start_square == H1 and position[end_square + WEST] == "K" and castling[1]:  # the piece is a rook on h1, and the king is on e1 with empty squares in between, and kingside castling is allowed
-                    move_list.append((end_square + WEST, end_square + EAST, piece_captured, ""))
-    move_list.sort(key=lambda move: evaluate_move(move, position, en_passant), reverse=True)  # sort moves by basic evaluation
+                if start_square == A1 and board[end_square + EAST] == "K" and castling & CASTLING_A1:  # the piece is a rook on a1, and the king is on e1 with empty squares in between, and queenside castling is allowed
+                    move_list.append((end_square + EAST, end_square + WEST, ".", ""))
+                if start_square == H1 and board[end_square + WEST] == "K" and castling & CASTLING_H1:  # the piece is a rook on h1, and the king is on e1 with empty squares in between, and kingside castling is allowed
+                    move_list.append((end_square + WEST, end_square + EAST, ".", ""))
     return move_list
 
 
-def make_move(move: tuple[int, int, str, str], position: str, castling: list[bool], opponent_castling: list[bool], en_passant: int, king_passant: int, color: str) -> tuple[str, list[bool], list[bool], int, int, str]:
-    """Makes a move on the given position."""
-    list_position: list[str] = list(position)
+def ordered_moves(position: Position, hash_move: tuple[int, int, str, str], killers: list[tuple[int, int, str, str]], counter_move: tuple[int, int, str, str]) -> Iterator[tuple[int, int, str, str]]:
+    """Yields the pseudo-legal moves for a given position in stages: the hash move, captures that don't lose material
+    in MVV-LVA order, promotions and en passant captures, the killer moves and counter move, quiet moves sorted by their
+    history score and evaluate_move(), and finally the captures that lose material according to static_exchange().
+    Each stage is only generated once the previous one has been searched, so a cutoff on an early move skips the work
+    for the remaining moves."""
+    board: str = position.board
+    en_passant: int = position.en_passant
+    # A hash move comes from a position with the same key so a light sanity check is enough to guard against collisions
+    if hash_move != (0, 0, "", "") and board[hash_move[0]].isupper() and board[hash_move[1]] == hash_move[2]:
+        yield hash_move
+    losing_captures: list[tuple[int, int, str, str]] = []
+    for move in generate_captures(board):
+        if move == hash_move:
+            continue
+        if losing_capture(board, move):
+            losing_captures.append(move)
+        else:
+            yield move
+    quiet_moves: list[tuple[int, int, str, str]] = []
+    for move in generate_quiet_moves(board, position.castling, en_passant):
+        if move == hash_move:
+            continue
+        if move[3] != "" or move[1] == en_passant:  # promotion or en passant capture
+            yield move
+        else:
+            quiet_moves.append(move)
+    for move in (*killers, counter_move):  # only moves that were generated are legal in this position
+        if move in quiet_moves:
+            quiet_moves.remove(move)
+            yield move
+    phase: int = scale_phase(position.scores[2])
+    quiet_moves.sort(key=lambda move: HISTORY_TABLE[move[0] * 120 + move[1]] + evaluate_move(move, board, en_passant, phase), reverse=True)
+    yield from quiet_moves
+    yield from losing_captures
+
+
+def make_move(move: tuple[int, int, str, str], position: Position) -> Position:
+    """Makes a move on the given position, updating its Zobrist key and material scores incrementally."""
+    board, castling, en_passant, king_passant, color, key, scores = position
+    list_position: list[str] = list(board)
     start_square: int = move[0]
     end_square: int = move[1]
     promotion_piece: str = move[3]
     piece_moved: str = list_position[start_square]
+    piece_captured: str = list_position[end_square]
+    piece_keys: dict[str, list[int]] = ZOBRIST_PIECE_KEYS[color]
+    score, rotated_score, phase = scores
+    castling_keys: list[int] = ZOBRIST_CASTLING_KEYS[color]
+    key ^= castling_keys[castling] ^ en_passant_key(board, en_passant, color)  # rehashed after the move
+    key ^= piece_keys[piece_moved][start_square] ^ piece_keys[piece_moved][end_square]
+    score += PIECE_SQUARE_SCORES[piece_moved][end_square] - PIECE_SQUARE_SCORES[piece_moved][start_square]
+    rotated_score += ROTATED_PIECE_SQUARE_SCORES[piece_moved][end_square] - ROTATED_PIECE_SQUARE_SCORES[piece_moved][start_square]
+    if piece_captured != ".":
+        key ^= piece_keys[piece_captured][end_square]
+        score -= PIECE_SQUARE_SCORES[piece_captured][end_square]
+        rotated_score -= ROTATED_PIECE_SQUARE_SCORES[piece_captured][end_square]
+        phase += PIECE_PHASES[piece_captured]
     king_passant = 0
     list_position[start_square] = "."
     list_position[end_square] = piece_moved
-    if start_square == A1:  # queenside rook moved
-        castling[0] = False
-    if start_square == H1:  # kingside rook moved
-        castling[1] = False
-    if end_square == A8:  # opponent queenside rook captured
-        opponent_castling[0] = False
-    if end_square == H8:  # opponent kingside rook captured
-        opponent_castling[1] = False
-    if piece_moved == "K":
-        king_passant = 0
-        castling[0] = False
-        castling[1] = False
-        if start_square - end_square == 2:  # queenside castling
-            king_passant = (start_square + end_square) // 2
-            list_position[A1], list_position[king_passant] = list_position[king_passant], list_position[A1]
-        if end_square - start_square == 2:  # kingside castling
-            king_passant = (start_square + end_square) // 2
-            list_position[H1], list_position[king_passant] = list_position[king_passant], list_position[H1]
-    elif piece_moved == "P":
+    castling &= CASTLING_MASKS[start_square] & CASTLING_MASKS[end_square]  # a rook moved or an opponent rook was captured
+    if piece_moved == "P":
         if end_square == en_passant:  # en passant capture
             list_position[end_square + SOUTH] = "."
+            key ^= piece_keys["p"][end_square + SOUTH]
+            score -= PIECE_SQUARE_SCORES["p"][end_square + SOUTH]
+            rotated_score -= ROTATED_PIECE_SQUARE_SCORES["p"][end_square + SOUTH]
         if A8 <= end_square <= H8:  # pawn promotion
             list_position[end_square] = promotion_piece
+            key ^= piece_keys["P"][end_square] ^ piece_keys[promotion_piece][end_square]
+            score += PIECE_SQUARE_SCORES[promotion_piece][end_square] - PIECE_SQUARE_SCORES["P"][end_square]
+            rotated_score += ROTATED_PIECE_SQUARE_SCORES[promotion_piece][end_square] - ROTATED_PIECE_SQUARE_SCORES["P"][end_square]
+            phase -= PIECE_PHASES[promotion_piece]
         if end_square - start_square == NORTH + NORTH:  # double pawn push
             en_passant = end_square + SOUTH
         else:
             en_passant = 0
-    position = "".join(list_position)
-    return position, castling, opponent_castling, en_passant, king_passant, color
+    else:
+        en_passant = 0
+        if piece_moved == "K":
+            castling &= CASTLING_H8 | CASTLING_A8  # only the opponent's rights are left
+            if start_square - end_square == 2:  # queenside castling
+                king_passant = (start_square + end_square) // 2
+                list_position[A1], list_position[king_passant] = list_position[king_passant], list_position[A1]
+                key ^= piece_keys["R"][A1] ^ piece_keys["R"][king_passant]
+                score += PIECE_SQUARE_SCORES["R"][king_passant] - PIECE_SQUARE_SCORES["R"][A1]
+                rotated_score += ROTATED_PIECE_SQUARE_SCORES["R"][king_passant] - ROTATED_PIECE_SQUARE_SCORES["R"][A1]
+            if end_square - start_square == 2:  # kingside castling
+                king_passant = (start_square + end_square) // 2
+                list_position[H1], list_position[king_passant] = list_position[king_passant], list_position[H1]
+                key ^= piece_keys["R"][H1] ^ piece_keys["R"][king_passant]
+                score += PIECE_SQUARE_SCORES["R"][king_passant] - PIECE_SQUARE_SCORES["R"][H1]
+                rotated_score += ROTATED_PIECE_SQUARE_SCORES["R"][king_passant] - ROTATED_PIECE_SQUARE_SCORES["R"][H1]
+    board = "".join(list_position)
+    key ^= castling_keys[castling] ^ en_passant_key(board, en_passant, color)
+    return Position(board, castling, en_passant, king_passant, color, key, (score, rotated_score, phase))
+
+
+def make_null_move(position: Position) -> Position:
+    """Passes the turn without moving a piece (for null-move pruning), only the en passant square is cleared."""
+    key: int = position.key ^ en_passant_key(position.board, position.en_passant, position.color)
+    return position._replace(en_passant=0, king_passant=0, key=key)
+
+
+def rotate_position(position: Position) -> Position:
+    """Rotates the board 180 degrees and swaps the case of the pieces so that it is from the opponent's point of view.
+    Typically called after make_move() since our engine always looks from the current player's point of view. Only
+    the padding around the board moves differently from the squares, and nothing reads it."""
+    board, castling, en_passant, king_passant, color, key, scores = position
+    return Position(
+        board[::-1].swapcase(),
+        ROTATED_CASTLING[castling],
+        119 - en_passant,
+        119 - king_passant,
+        "b" if color == "w" else "w",
+        key ^ ZOBRIST_TURN_KEY,  # the pieces, castling rights and en passant square are unchanged from white's point of view
+        (scores[1], scores[0], scores[2]),
+    )
+
+
+def is_square_attacked(board: str, square: int) -> bool:
+    """Finds if the given square is attacked by any of the current player's pieces by looking outwards from the square
+    along the knight, pawn and sliding piece directions."""
+    if board[square + SOUTH + WEST] == "P" or board[square + SOUTH + EAST] == "P":  # pawns capture towards the north
+        return True
+    for direction in PIECE_DIRECTIONS["N"]:
+        if board[square + direction] == "N":
+            return True
+    for direction in PIECE_DIRECTIONS["B"]:
+        end_square: int = square + direction
+        if board[end_square] == "K":
+            return True
+        while board[end_square] == ".":
+            end_square += direction
+        if board[end_square] == "B" or board[end_square] == "Q":
+            return True
+    for direction in PIECE_DIRECTIONS["R"]:
+        end_square: int = square + direction
+        if board[end_square] == "K":
+            return True
+        while board[end_square] == ".":
+            end_square += direction
+        if board[end_square] == "R" or board[end_square] == "Q":
+            return True
+    return False
 
 
-def rotate_position(position: str, castling: list[bool], opponent_castling: list[bool], en_passant: int, king_passant: int, color: str) -> tuple[str, list[bool], list[bool], int, int, str]:
-    """Rotates the board 180 degrees and swaps the case of the pieces so that it is from the opponent's point of view.
-    Typically called after make_move() since our engine always looks from the current player's point of view."""
-    en_passant = 119 - en_passant
-    king_passant = 119 - king_passant
-    castling, opponent_castling = opponent_castling, castling
-    list_position: list[str] = list(position)
-    for i in range(60):  # only need to loop through half the board since we're swapping two squares at a time
-        if not list_position[i].isspace():
-            list_position[119 - i], list_position[i] = list_position[i].swapcase(), list_position[119 - i].swapcase()
-    position = "".join(list_position)
-    color = "b" if color == "w" else "w"
-    return position, castling, opponent_castling, en_passant, king_passant, color
-
-
-def king_in_check(position: str, castling: list[bool], king_passant: int) -> bool:
+def least_valuable_attacker(board: list[str], square: int, ours: bool) -> int:
+    """Finds the square of the least valuable piece attacking the given square for the current player (ours) or the
+    opponent, or -1 if there is none. Used by static_exchange() on a board where pieces are removed as they capture."""
+    pawn, knight, bishop, rook, queen, king = "PNBRQK" if ours else "pnbrqk"
+    pawn_square: int = square + (SOUTH if ours else NORTH)  # our pawns capture towards the north
+    if board[pawn_square + WEST] == pawn:
+        return pawn_square + WEST
+    if board[pawn_square + EAST] == pawn:
+        return pawn_square + EAST
+    for direction in PIECE_DIRECTIONS["N"]:
+        if board[square + direction] == knight:
+            return square + direction
+    queen_square: int = -1
+    for pieces, directions in ((bishop, PIECE_DIRECTIONS["B"]), (rook, PIECE_DIRECTIONS["R"])):
+        for direction in directions:
+            end_square: int = square + direction
+            while board[end_square] == ".":
+                end_square += direction
+            if board[end_square] == pieces:
+                return end_square
+            if board[end_square] == queen:
+                queen_square = end_square
+    if queen_square != -1:
+        return queen_square
+    for direction in PIECE_DIRECTIONS["K"]:
+        if board[square + direction] == king:
+            return square + direction
+    return -1
+
+
+def static_exchange(board: str, move: tuple[int, int, str, str]) -> int:
+    """Static exchange evaluation (SEE): resolves the sequence of captures on the target square of a capture, with both
+    sides recapturing with their least valuable piece and free to stop when it would lose material, and returns the
+    material won by the capture in centipawns (negative if it loses material)."""
+    pieces: list[str] = list(board)
+    square: int = move[1]
+    gains: list[int] = [MIDGAME_PIECE_VALUES[move[2].upper()]]
+    piece_on_square: str = pieces[move[0]]
+    if move[3] != "":  # promotion
+        gains[0] += MIDGAME_PIECE_VALUES[move[3]] - MIDGAME_PIECE_VALUES["P"]
+        piece_on_square = move[3]
+    pieces[move[0]] = "."  # pieces behind the ones that capture join in (x-rays)
+    ours: bool = False
+    while True:
+        attacker_square: int = least_valuable_attacker(pieces, square, ours)
+        if attacker_square == -1:
+            break
+        if pieces[attacker_square].upper() == "K" and least_valuable_attacker(pieces, square, not ours) != -1:  # the king can't capture a defended piece
+            break
+        gains.append(MIDGAME_PIECE_VALUES[piece_on_square.upper()] - gains[-1])  # score of the capture for the side making it
+        piece_on_square = pieces[attacker_square]
+        pieces[attacker_square] = "."
+        ours = not ours
+    for i in range(len(gains) - 1, 0, -1):  # a side only captures if it's better than standing pat
+        gains[i - 1] = -max(-gains[i - 1], gains[i])
+    return gains[0]
+
+
+def losing_capture(board: str, move: tuple[int, int, str, str]) -> bool:
+    """Finds if a capture loses material according to static_exchange(). Taking a piece at least as valuable as the
+    one capturing can't lose material so the exchange isn't evaluated then."""
+    if MIDGAME_PIECE_VALUES[board[move[0]]] <= MIDGAME_PIECE_VALUES[move[2].upper()]:
+        return False
+    return static_exchange(board, move) < 0
+
+
+def side_in_check(board: str) -> bool:
+    """Finds if the current player's king is in check, the reversed and case swapped board is the rotated board that
+    king_in_check() expects."""
+    return king_in_check(board[::-1].swapcase(), 0)
+
+
+def king_in_check(board: str, king_passant: int) -> bool:
     """Finds if the opponent's king is in check or if they were in check before castling. Typically called after
     make_move() and rotate_position() to see if the move was legal."""
-    king_position: int = position.find("k") if "k" in position else 0  # after rotating the board, our king "becomes the opponent's king" ("k") in that position
-    if king_position == 0:
+    if COLLECT_STATISTICS:
+        STATISTICS["legality_checks"] += 1
+    king_position: int = board.find("k")  # after rotating the board, our king "becomes the opponent's king" ("k") in that position
+    if king_position == -1:
+        return True
+
+    if is_square_attacked(board, king_position):
         return True
 
-    # Since we call find_check() after make_move(), we check to see if the move we just made was castling.
+    # Since we call king_in_check() after make_move(), we check to see if the move we just made was castling.
     # If it was, we use the king passant square and the original king position to see if they were attacked.
     # If they were, it means that the castling move was illegal.
-    castled: bool = False
-    original_king_position: int = 0
     if king_passant in [23, 25]:
-        original_king_position = 24
-        castled = True
-    elif king_passant in [24, 26]:
-        original_king_position = 25
-        castled = True
-    move_list: list[tuple[int, int, str, str]] = generate_moves(position, castling[:], 0)
-    for move in move_list:
-        if move[1] == king_position or move[1] == king_passant:
-            return True
+        return is_square_attacked(board, king_passant) or is_square_attacked(board, 24)
+    if king_passant in [24, 26]:
+        return is_square_attacked(board, king_passant) or is_square_attacked(board, 25)
+    return False
 
-        if castled and move[1] == original_king_position:
-            return True
 
-    return False
+def perft(depth: int, position: Position, cache: dict[tuple[int, int], int] | None = None) -> int:
+    """Counts the leaf nodes of the legal move tree of the given depth, used to verify move generation. Subtree counts
+    are stored in the cache by Zobrist key and depth if one is given."""
+    if depth == 0:
+        return 1
+    if cache is not None and (position.key, depth) in cache:
+        return cache[(position.key, depth)]
+    leaf_nodes: int = 0
+    for move in generate_captures(position.board) + generate_quiet_moves(position.board, position.castling, position.en_passant):
+        new_position: Position = rotate_position(make_move(move, position))
+        if king_in_check(new_position.board, new_position.king_passant):  # move is illegal
+            continue
+        leaf_nodes += perft(depth - 1, new_position, cache)
+    if cache is not None:
+        cache[(position.key, depth)] = leaf_nodes
+    return leaf_nodes
+
+
+####################
+# BITBOARD BACKEND #
+####################
+
+def bitboard_square(square: int) -> int:
+    """Converts an index in the 10x12 board representation (from white's point of view) to a bitboard square."""
+    return (9 - (square // 10)) * 8 + (square % 10) - 1
+
+
+def bitboard_position(position: Position) -> tuple[list[int], str, int, int]:
+    """Converts a position to the bitboard backend's representation: (piece_bitboards, color, castling_rights,
+    en_passant_square), where castling rights are bits (K = 1, Q = 2, k = 4, q = 8) and the en passant square is -1 if
+    there is none."""
+    color: str = position.color
+    if color == "b":  # bitboards are always from white's point of view
+        position = rotate_position(position)
+    piece_bitboards: list[int] = [0] * 12
+    for square, piece in enumerate(position.board):
+        if piece.isalpha():
+            piece_bitboards[PIECE_ENCODINGS[piece]] |= 1 << bitboard_square(square)
+    en_passant: int = position.en_passant
+    en_passant_square: int = bitboard_square(en_passant) if A8 <= en_passant <= H1 and 1 <= en_passant % 10 <= 8 else -1
+    return piece_bitboards, color, position.castling, en_passant_square  # the castling bits from white's point of view are the same
+
+
+def bitboard_occupancy(piece_bitboards: list[int], side: int) -> int:
+    """Returns the bitboard of every square occupied by the pieces of one side (1 for white, 0 for black)."""
+    return piece_bitboards[side] | piece_bitboards[side + 2] | piece_bitboards[side + 4] | piece_bitboards[side + 6] | piece_bitboards[side + 8] | piece_bitboards[side + 10]
+
+
+def bitboard_ray_attacks(square: int, occupied: int, direction: int) -> int:
+    """Returns the squares attacked from a square along a direction, stopping at (and including) the first blocker."""
+    attacks: int = BITBOARD_RAYS[direction][square]
+    blockers: int = attacks & occupied
+    if blockers:
+        if direction < 4:  # ray towards higher squares, the nearest blocker is the lowest set bit
+            blocker: int = (blockers & -blockers).bit_length() - 1
+        else:  # ray towards lower squares, the nearest blocker is the highest set bit
+            blocker: int = blockers.bit_length() - 1
+        attacks ^= BITBOARD_RAYS[direction][blocker]
+    return attacks
+
+
+def bitboard_slider_attacks(square: int, occupied: int, directions: list[int]) -> int:
+    """Returns the squares attacked by a sliding piece along the given directions."""
+    attacks: int = 0
+    for direction in directions:
+        attacks |= bitboard_ray_attacks(square, occupied, direction)
+    return attacks
+
+
+def is_bitboard_square_attacked(piece_bitboards: list[int], square: int, side: int) -> bool:
+    """Finds if the given square is attacked by any of one side's pieces (1 for white, 0 for black)."""
+    if BITBOARD_PAWN_ATTACKS[side ^ 1][square] & piece_bitboards[side]:  # a pawn attacks the square if a pawn of the other color on the square would attack it
+        return True
+    if BITBOARD_KNIGHT_ATTACKS[square] & piece_bitboards[side + 2] or BITBOARD_KING_ATTACKS[square] & piece_bitboards[side + 10]:
+        return True
+    occupied: int = bitboard_occupancy(piece_bitboards, 0) | bitboard_occupancy(piece_bitboards, 1)
+    if bitboard_slider_attacks(square, occupied, BITBOARD_BISHOP_DIRECTIONS) & (piece_bitboards[side + 4] | piece_bitboards[side + 8]):
+        return True
+    return bool(bitboard_slider_attacks(square, occupied, BITBOARD_ROOK_DIRECTIONS) & (piece_bitboards[side + 6] | piece_bitboards[side + 8]))
+
+
+def bitboard_piece_count(piece_bitboards: list[int], piece: str) -> int:
+    """Counts the pieces of a given type (uppercase for white, lowercase for black)."""
+    return piece_bitboards[PIECE_ENCODINGS[piece]].bit_count()
+
+
+def generate_bitboard_moves(piece_bitboards: list[int], color: str, castling_rights: int, en_passant_square: int, captures_only: bool = False) -> list[tuple[int, int, str]]:
+    """Generates all pseudo-legal moves (or only captures, including en passant) for a position of the bitboard
+    backend. Moves are represented as tuples: (start_square, end_square, promotion_piece)"""
+    move_list: list[tuple[int, int, str]] = []
+    side: int = 1 if color == "w" else 0
+    ally: int = bitboard_occupancy(piece_bitboards, side)
+    enemy: int = bitboard_occupancy(piece_bitboards, side ^ 1)
+    occupied: int = ally | enemy
+    targets: int = enemy if captures_only else ~ally
+    forward: int = 8 if side else -8
+    # Pawns
+    pawns: int = piece_bitboards[side]
+    capture_targets: int = enemy | (1 << en_passant_square if en_passant_square != -1 else 0)
+    while pawns:
+        start_square: int = (pawns & -pawns).bit_length() - 1
+        pawns &= pawns - 1
+        end_squares: int = BITBOARD_PAWN_ATTACKS[side][start_square] & capture_targets
+        if not captures_only and not (occupied >> (start_square + forward)) & 1:
+            end_squares |= 1 << (start_square + forward)
+            if start_square // 8 == (1 if side else 6) and not (occupied >> (start_square + 2 * forward)) & 1:  # double pawn push
+                end_squares |= 1 << (start_square + 2 * forward)
+        while end_squares:
+            end_square: int = (end_squares & -end_squares).bit_length() - 1
+            end_squares &= end_squares - 1
+            if end_square // 8 == (7 if side else 0):  # pawn promotion
+                for promotion_piece in "QRBN":
+                    move_list.append((start_square, end_square, promotion_piece))
+            else:
+                move_list.append((start_square, end_square, ""))
+    # Knights, bishops, rooks, queens and the king
+    for piece_index in range(side + 2, 12, 2):
+        pieces: int = piece_bitboards[piece_index]
+        while pieces:
+            start_square: int = (pieces & -pieces).bit_length() - 1
+            pieces &= pieces - 1
+            if piece_index < 4:
+                end_squares: int = BITBOARD_KNIGHT_ATTACKS[start_square]
+            elif piece_index < 6:
+                end_squares: int = bitboard_slider_attacks(start_square, occupied, BITBOARD_BISHOP_DIRECTIONS)
+            elif piece_index < 8:
+                end_squares: int = bitboard_slider_attacks(start_square, occupied, BITBOARD_ROOK_DIRECTIONS)
+            elif piece_index < 10:
+                end_squares: int = bitboard_slider_attacks(start_square, occupied, BITBOARD_BISHOP_DIRECTIONS + BITBOARD_ROOK_DIRECTIONS)
+            else:
+                end_squares: int = BITBOARD_KING_ATTACKS[start_square]
+            end_squares &= targets
+            while end_squares:
+                end_square: int = (end_squares & -end_squares).bit_length() - 1
+                end_squares &= end_squares - 1
+                move_list.append((start_square, end_square, ""))
+    # Castling, the king may not castle out of, through or into check
+    if not captures_only:
+        king_square: int = 4 if side else 60
+        if castling_rights & (1 if side else 4) and not occupied & (0b11 << (king_square + 1)):
+            if not any(is_bitboard_square_attacked(piece_bitboards, square, side ^ 1) for square in (king_square, king_square + 1, king_square + 2)):
+                move_list.append((king_square, king_square + 2, ""))
+        if castling_rights & (2 if side else 8) and not occupied & (0b111 << (king_square - 3)):
+            if not any(is_bitboard_square_attacked(piece_bitboards, square, side ^ 1) for square in (king_square, king_square - 1, king_square - 2)):
+                move_list.append((king_square, king_square - 2, ""))
+    return move_list
+
+
+def make_bitboard_move(move: tuple[int, int, str], piece_bitboards: list[int], color: str, castling_rights: int, en_passant_square: int) -> tuple[list[int], str, int, int]:
+    """Makes a move on a position of the bitboard backend, returning the new position with the opponent to move."""
+    piece_bitboards = piece_bitboards[:]
+    start_square, end_square, promotion_piece = move
+    side: int = 1 if color == "w" else 0
+    start_bit: int = 1 << start_square
+    end_bit: int = 1 << end_square
+    piece_index: int = side
+    while not piece_bitboards[piece_index] & start_bit:
+        piece_index += 2
+    for captured_index in range(side ^ 1, 12, 2):
+        if piece_bitboards[captured_index] & end_bit:
+            piece_bitboards[captured_index] ^= end_bit
+            break
+    piece_bitboards[piece_index] ^= start_bit | end_bit
+    new_en_passant_square: int = -1
+    if piece_index == side:  # pawn
+        if end_square == en_passant_square:  # en passant capture
+            piece_bitboards[side ^ 1] ^= 1 << (end_square - (8 if side else -8))
+        elif promotion_piece != "":
+            piece_bitboards[side] ^= end_bit
+            piece_bitboards[PIECE_ENCODINGS[promotion_piece if side else promotion_piece.lower()]] |= end_bit
+        elif abs(end_square - start_square) == 16:  # double pawn push
+            new_en_passant_square = (start_square + end_square) // 2
+    elif piece_index == side + 10 and abs(end_square - start_square) == 2:  # castling, move the rook as well
+        if end_square > start_square:
+            piece_bitboards[side + 6] ^= (1 << (start_square + 3)) | (1 << (start_square + 1))
+        else:
+            piece_bitboards[side + 6] ^= (1 << (start_square - 4)) | (1 << (start_square - 1))
+    castling_rights &= BITBOARD_CASTLING_MASKS[start_square] & BITBOARD_CASTLING_MASKS[end_square]
+    return piece_bitboards, "b" if side else "w", castling_rights, new_en_passant_square
+
+
+def bitboard_perft(depth: int, piece_bitboards: list[int], color: str, castling_rights: int, en_passant_square: int, cache: dict[tuple, int] | None = None) -> int:
+    """Counts the leaf nodes of the legal move tree of the given depth using the bitboard backend. Subtree counts are
+    stored in the cache by position and depth if one is given."""
+    if depth == 0:
+        return 1
+    cache_key: tuple = (*piece_bitboards, color, castling_rights, en_passant_square, depth)
+    if cache is not None and cache_key in cache:
+        return cache[cache_key]
+    leaf_nodes: int = 0
+    side: int = 1 if color == "w" else 0
+    for move in generate_bitboard_moves(piece_bitboards, color, castling_rights, en_passant_square):
+        new_position: tuple[list[int], str, int, int] = make_bitboard_move(move, piece_bitboards, color, castling_rights, en_passant_square)
+        king: int = new_position[0][side + 10]
+        if is_bitboard_square_attacked(new_position[0], king.bit_length() - 1, side ^ 1):  # move is illegal
+            continue
+        leaf_nodes += bitboard_perft(depth - 1, *new_position, cache=cache)
+    if cache is not None:
+        cache[cache_key] = leaf_nodes
+    return leaf_nodes
+
+
+def bitboard_notation(move: tuple[int, int, str]) -> str:
+    """Converts a move of the bitboard backend to long algebraic notation."""
+    return "".join(chr(ord("a") + square % 8) + str(square // 8 + 1) for square in move[:2]) + move[2].lower()
 
 
 ########################
@@ -652,14 +1346,31 @@ def manhattan_distance(square1: int, square2: int) -> int:
     return abs(square1 % 10 - square2 % 10) + abs(square1 // 10 - square2 // 10)
 
 
-def game_phase(position: str) -> int:
+def pack_score(midgame_score: int, endgame_score: int) -> int:
+    """Packs a midgame and an endgame score into a single integer so that both can be added and subtracted at once."""
+    return midgame_score + (endgame_score << 32)
+
+
+def unpack_score(score: int) -> tuple[int, int]:
+    """Splits an integer created by pack_score() (or a sum of them) back into its midgame and endgame scores."""
+    midgame_score: int = ((score + (1 << 31)) & 0xFFFFFFFF) - (1 << 31)
+    return midgame_score, (score - midgame_score) >> 32
+
+
+def scale_phase(phase: int) -> int:
+    """Scales a game phase counted in piece phases (0 with all pieces on the board) to the 0-256 range used by
+    interpolate()."""
+    return (phase * 256 + (TOTAL_PHASE // 2)) // TOTAL_PHASE
+
+
+def game_phase(board: str) -> int:
     """Evaluates the current game phase though piece counts."""
     phase: int = TOTAL_PHASE
-    phase -= (position.count("N") + position.count("n")) * KNIGHT_PHASE
-    phase -= (position.count("B") + position.count("b")) * BISHOP_PHASE
-    phase -= (position.count("R") + position.count("r")) * ROOK_PHASE
-    phase -= (position.count("Q") + position.count("q")) * QUEEN_PHASE
-    return (phase * 256 + (TOTAL_PHASE // 2)) // TOTAL_PHASE
+    phase -= (board.count("N") + board.count("n")) * KNIGHT_PHASE
+    phase -= (board.count("B") + board.count("b")) * BISHOP_PHASE
+    phase -= (board.count("R") + board.count("r")) * ROOK_PHASE
+    phase -= (board.count("Q") + board.count("q")) * QUEEN_PHASE
+    return scale_phase(phase)
 
 
 def interpolate(midgame_score: int, endgame_score: int, phase: int) -> int:
@@ -667,42 +1378,73 @@ def interpolate(midgame_score: int, endgame_score: int, phase: int) -> int:
     return ((midgame_score * (256 - phase)) + (endgame_score * phase)) // 256
 
 
-def evaluate_position(position: str, castling: list[bool], opponent_castling: list[bool], en_passant: int, king_passant: int, color: str) -> int:
-    """Evaluates the given position for the side-to-move using material values, piece square tables, king tropism,
-    and mop-up bonus and interpolating between midgame and endgame scores."""
+def position_scores(board: str) -> tuple[int, int, int]:
+    """Calculates the packed material and piece square table score of the given position for the side-to-move and for
+    the opponent (as it will be after rotate_position()), along with the game phase in piece phases. Only needed to set
+    up a position since make_move() and rotate_position() keep the scores up to date afterwards."""
+    score: int = 0
+    rotated_score: int = 0
+    phase: int = TOTAL_PHASE
+    for square, piece in enumerate(board):
+        if piece.isalpha():
+            score += PIECE_SQUARE_SCORES[piece][square]
+            rotated_score += ROTATED_PIECE_SQUARE_SCORES[piece][square]
+            phase -= PIECE_PHASES[piece]
+    return score, rotated_score, phase
+
 
-    key: int = zobrist_hash(position, castling, opponent_castling, en_passant, king_passant, color)
+def evaluate_position(position: Position) -> int:
+    """Evaluates the given position for the side-to-move, repeated positions are draws and other positions are looked up
+    in the evaluation cache before being evaluated by full_evaluation()."""
+    if COLLECT_STATISTICS:
+        STATISTICS["evaluations"] += 1
+
+    key: int = position.key
     if REPETITION_TABLE.get(key) is not None and REPETITION_TABLE[key] >= 2:
         return 0
 
-    midgame_score: int = 0
-    endgame_score: int = 0
-    king_square: int = position.find("K") if "K" in position else 0
-    opponent_king_square: int = position.find("k") if "k" in position else 0
-    for square, piece in enumerate(position):
+    index: int = (key % (len(EVALUATION_CACHE) >> 1)) << 1
+    if EVALUATION_CACHE[index] == key:
+        return EVALUATION_CACHE[index + 1] - SCORE_OFFSET
+    if COLLECT_STATISTICS:
+        STATISTICS["eval_cache_misses"] += 1
+    score: int = full_evaluation(position)
+    EVALUATION_CACHE[index] = key
+    EVALUATION_CACHE[index + 1] = score + SCORE_OFFSET
+    return score
+
+
+def full_evaluation(position: Position) -> int:
+    """Evaluates the given position for the side-to-move using material values, piece square tables, king tropism,
+    and mop-up bonus and interpolating between midgame and endgame scores. Material values and piece square tables are
+    kept up to date by make_move() so only king tropism and the mop-up bonus are calculated here."""
+
+    board: str = position.board
+    score: int = position.scores[0]
+    king_square: int = board.find("K") if "K" in board else 0
+    opponent_king_square: int = board.find("k") if "k" in board else 0
+    king_distances: list[int] = MANHATTAN_DISTANCES[king_square]
+    opponent_king_distances: list[int] = MANHATTAN_DISTANCES[opponent_king_square]
+    for square, piece in enumerate(board):
         if piece.isupper():  # ally piece
-            midgame_score += MIDGAME_PIECE_VALUES[piece] + MIDGAME_PIECE_SQUARE_TABLES[piece][square]
-            midgame_score += MIDGAME_TROPISM_VALUES[piece] // manhattan_distance(square, opponent_king_square)
-            endgame_score += ENDGAME_PIECE_VALUES[piece] + ENDGAME_PIECE_SQUARE_TABLES[piece][square]
-            endgame_score += ENDGAME_TROPISM_VALUES[piece] // manhattan_distance(square, opponent_king_square)
+            score += TROPISM_SCORES[piece][opponent_king_distances[square]]
         elif piece.islower():  # opponent piece
-            midgame_score -= MIDGAME_PIECE_VALUES[piece.upper()] + MIDGAME_PIECE_SQUARE_TABLES[piece.upper()][(11 - (square // 10)) * 10 + (square % 10)]
-            midgame_score -= MIDGAME_TROPISM_VALUES[piece.upper()] // manhattan_distance(square, king_square)
-            endgame_score -= ENDGAME_PIECE_VALUES[piece.upper()] + ENDGAME_PIECE_SQUARE_TABLES[piece.upper()][(11 - (square // 10)) * 10 + (square % 10)]
-            endgame_score -= ENDGAME_TROPISM_VALUES[piece.upper()] // manhattan_distance(square, king_square)
-    mop_up_bonus: int = MOP_UP_SCORE * (14 - manhattan_distance(king_square, opponent_king_square)) // 14
+            score += TROPISM_SCORES[piece][king_distances[square]]
+    midgame_score, endgame_score = unpack_score(score)
+    mop_up_bonus: int = MOP_UP_SCORE * (14 - king_distances[opponent_king_square]) // 14
     if endgame_score > 0:
         endgame_score += mop_up_bonus
     elif endgame_score < 0:
         endgame_score -= mop_up_bonus
-    return interpolate(midgame_score, endgame_score, game_phase(position))
+    return interpolate(midgame_score, endgame_score, scale_phase(position.scores[2]))
 
 
-def evaluate_move(move: tuple[int, int, str, str], position: str, en_passant: int) -> int:
-    """Evaluates the given move for the side-to-move by interpolating between midgame and endgame scores."""
+def evaluate_move(move: tuple[int, int, str, str], board: str, en_passant: int, phase: int) -> int:
+    """Evaluates the given move for the side-to-move by interpolating between midgame and endgame scores using the
+    given game phase (from game_phase())."""
     start_square: int = move[0]
     end_square: int = move[1]
-    piece_moved: str = position[start_square]
+    piece_moved: str = board[start_square]
     piece_captured: str = move[2]
     promotion_piece: str = move[3]
     midgame_score: int = MIDGAME_PIECE_SQUARE_TABLES[piece_moved][end_square] - MIDGAME_PIECE_SQUARE_TABLES[piece_moved][start_square]
@@ -717,122 +1459,158 @@ def evaluate_move(move: tuple[int, int, str, str], position: str, en_passant: in
         if A8 <= end_square <= H8:  # pawn promotion
             midgame_score += MIDGAME_PIECE_SQUARE_TABLES[promotion_piece][end_square] - MIDGAME_PIECE_SQUARE_TABLES["P"][end_square] + MIDGAME_PIECE_VALUES[promotion_piece] - MIDGAME_PIECE_VALUES["P"]
             endgame_score += ENDGAME_PIECE_SQUARE_TABLES[promotion_piece][end_square] - ENDGAME_PIECE_SQUARE_TABLES["P"][end_square] + ENDGAME_PIECE_VALUES[promotion_piece] - ENDGAME_PIECE_VALUES["P"]
-        if end_square + SOUTH == en_passant:
+        if end_square == en_passant:  # en passant capture
             midgame_score += MIDGAME_PIECE_SQUARE_TABLES["P"][(11 - ((end_square + SOUTH) // 10)) * 10 + ((end_square + SOUTH) % 10)]
             endgame_score += ENDGAME_PIECE_SQUARE_TABLES["P"][(11 - ((end_square + SOUTH) // 10)) * 10 + ((end_square + SOUTH) % 10)]
-    return interpolate(midgame_score, endgame_score, game_phase(position))
+    return interpolate(midgame_score, endgame_score, phase)
 
 
-def principal_variation(length: int, position: str, castling: list[bool], opponent_castling: list[bool], en_passant: int, king_passant: int, color: str) -> list[tuple[int, int, str, str]]:
+def principal_variation(length: int, position: Position) -> list[tuple[int, int, str, str]]:
     """Uses the transposition table to find the principal variation for the given position as a list of moves."""
-    key: int = zobrist_hash(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-    result: tuple[tuple[int, int, str, str], int, int] | None = TRANSPOSITION_TABLE.get(key)
-    if result is None or length <= 0:
+    result: tuple[tuple[int, int, str, str], int, int, int] | None = transposition_lookup(position.key)
+    if result is None or length <= 0 or result[0] == (0, 0, "", ""):
         return []
 
     best_move: tuple[int, int, str, str] = result[0]
-    new_position: tuple[str, list[bool], list[bool], int, int, str] = make_move(best_move, position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-    new_position = rotate_position(*new_position)
-    return [best_move] + principal_variation(length - 1, *new_position,)
+    new_position: Position = rotate_position(make_move(best_move, position))
+    return [best_move] + principal_variation(length - 1, new_position)
 
 
 ######################################
 # HASHING AND OPENING BOOK FUNCTIONS #
 ######################################
 
-def load_book(book_name: str) -> list[list[int]]:
-    """Loads an opening book and returns it as a list of lists of raw integer data."""
-    with open(f"{pathlib.Path(__file__).resolve().parent}/simPLY_chess-books/{book_name}.bin", "rb") as file:
-        file_content: bytes = file.read()
-    integer_data: list[int] = list(struct.unpack(">" + ("QHHI" * (len(file_content) // 16)), file_content))
-    return [integer_data[i:i + 4] for i in range(0, len(integer_data), 4)]
+def book_path(book_name: str) -> pathlib.Path:
+    """Returns the path of a shipped opening book given its name (e.g. "main5"), or the name itself if it is already
+    a path to a file."""
+    path: pathlib.Path = pathlib.Path(book_name)
+    if path.is_file():
+        return path
+    return BOOK_DIRECTORY / f"{book_name}.bin"
+
+
+def load_book(path: pathlib.Path) -> mmap.mmap:
+    """Memory-maps an opening book so that its entries can be searched without reading the whole file into memory."""
+    with open(path, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def book_lookup(opening_book: mmap.mmap, key: int, entry_format: struct.Struct = BOOK_ENTRY) -> list[tuple[int, ...]]:
+    """Binary searches the entries (which are sorted by key) of an opening book and returns every entry matching the
+    given key. Works for both PolyGlot and compiled books since both store the key first in fixed size entries."""
+    low: int = 0
+    high: int = len(opening_book) // entry_format.size
+    while low < high:  # find the first entry with a key greater than or equal to the given key
+        middle: int = (low + high) // 2
+        if BOOK_KEY.unpack_from(opening_book, middle * entry_format.size)[0] < key:
+            low = middle + 1
+        else:
+            high = middle
+    entries: list[tuple[int, ...]] = []
+    for offset in range(low * entry_format.size, len(opening_book), entry_format.size):
+        entry: tuple[int, ...] = entry_format.unpack_from(opening_book, offset)
+        if entry[0] != key:
+            break
+        entries.append(entry)
+    return entries
 
 
-def zobrist_hash(position: str, castling: list[bool], opponent_castling: list[bool], en_passant: int, king_passant: int, color: str) -> int:
-    """Calculates a Zobrist hash for the given position using the PolyGlot book format."""
-    if color == "b":
-        # Position must be from white's perspective for hashing
-        position, castling, opponent_castling, en_passant, king_passant, color = rotate_position(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-        turn_hash: int = 0
-    else:
-        turn_hash: int = HASH_VALUES[780]
-    piece_hash: int = 0
-    for i, piece in enumerate(position):
-        if not piece.isspace() and piece != ".":
-            row: int = 9 - (i // 10)
-            file: int = (i % 10) - 1
-            piece_hash ^= HASH_VALUES[(64 * PIECE_ENCODINGS[piece]) + (8 * row) + file]
-    castling_hash: int = 0
-    if castling[0]:
-        castling_hash ^= HASH_VALUES[768 + 1]
-    if castling[1]:
-        castling_hash ^= HASH_VALUES[768 + 0]
-    if opponent_castling[0]:
-        castling_hash ^= HASH_VALUES[768 + 3]
-    if opponent_castling[1]:
-        castling_hash ^= HASH_VALUES[768 + 2]
-    en_passant_hash: int = 0
-    if en_passant != 0 and en_passant != 119:
-        # Only hash en passant if there is a pawn that can perform the capture (legality of the move is not checked)
-        if 41 <= en_passant <= 48:  # white can capture en passant
-            if position[en_passant + SOUTH + EAST] == "P":
-                en_passant_hash: int = HASH_VALUES[772 + ((en_passant) % 10) - 1]
-            elif position[en_passant + SOUTH + WEST] == "P":
-                en_passant_hash: int = HASH_VALUES[772 + ((en_passant) % 10) - 1]
-        elif 71 <= en_passant <= 78:  # black can capture en passant
-            if position[en_passant + NORTH + EAST] == "p":
-                en_passant_hash: int = HASH_VALUES[772 + ((en_passant) % 10) - 1]
-            elif position[en_passant + NORTH + WEST] == "p":
-                en_passant_hash: int = HASH_VALUES[772 + ((en_passant) % 10) - 1]
-    return piece_hash ^ castling_hash ^ en_passant_hash ^ turn_hash
-
-
-def all_entries(opening_book: list[list[int]], position: str, castling: list[bool], opponent_castling: list[bool], en_passant: int, king_passant: int, color: str) -> list[tuple[tuple[int, int, str, str], int]]:
-    """Returns all entries in the PolyGlot opening book for the given position."""
-    key: int = zobrist_hash(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
+def decode_book_move(raw_move: int) -> tuple[int, int, int]:
+    """Decodes a PolyGlot move into its start and end squares in our 10x12 representation (from white's point of view)
+    and its encoded promotion piece."""
+    endian_start_square: int = (raw_move >> 6) & 0x3f
+    endian_end_square: int = raw_move & 0x3f
+    encoded_promotion_piece: int = (raw_move >> 12) & 0x7
+    start_square: int = 10 * (9 - (endian_start_square // 8)) + (endian_start_square % 8) + 1  # convert to our 10x12 representation
+    end_square: int = 10 * (9 - (endian_end_square // 8)) + (endian_end_square % 8) + 1
+    return start_square, end_square, encoded_promotion_piece
+
+
+def book_move(start_square: int, end_square: int, encoded_promotion_piece: int, board: str, color: str) -> tuple[int, int, str, str]:
+    """Converts a decoded book move into a move for the given position."""
+    if color == "b":  # flip move if from black's perspective
+        start_square = 119 - start_square
+        end_square = 119 - end_square
+    if board[start_square] == "K":  # adjust castling since PolyGlot represents it as e1h1 or e1a1 (instead of e1g1 or e1c1)
+        if end_square == H1 or end_square == A1:
+            end_square = start_square + (2 if end_square > start_square else -2)
+    return (start_square, end_square, board[end_square], DECODED_PROMOTION_PIECES[encoded_promotion_piece])
+
+
+def compile_book(book_names: list[str], output_path: pathlib.Path) -> int:
+    """Merges the given PolyGlot opening books into a single compiled book, combining the weights of duplicate entries.
+    Returns the number of entries written."""
+    weights: dict[tuple[int, int, int, int], int] = {}
+    for book_name in book_names:
+        opening_book: mmap.mmap = load_book(book_path(book_name))
+        for key, raw_move, weight, _ in BOOK_ENTRY.iter_unpack(opening_book):
+            entry: tuple[int, int, int, int] = (key, *decode_book_move(raw_move))
+            weights[entry] = weights.get(entry, 0) + weight
+        opening_book.close()
+    entries: list[tuple[tuple[int, int, int, int], int]] = sorted(weights.items(), key=lambda item: (item[0][0], -item[1]))
+    with open(output_path, "wb") as file:
+        file.write(b"".join(COMPILED_BOOK_ENTRY.pack(*entry, weight) for entry, weight in entries))
+    return len(entries)
+
+
+def en_passant_key(board: str, en_passant: int, color: str) -> int:
+    """Returns the part of the Zobrist key given by the en passant square. PolyGlot only hashes en passant if there is a
+    pawn that can perform the capture (legality of the move is not checked)."""
+    if 41 <= en_passant <= 48:  # current player can capture en passant
+        if board[en_passant + SOUTH + EAST] == "P" or board[en_passant + SOUTH + WEST] == "P":
+            return ZOBRIST_EN_PASSANT_KEYS[color][en_passant]
+    elif 71 <= en_passant <= 78:  # opponent can capture en passant (after make_move() but before rotate_position())
+        if board[en_passant + NORTH + EAST] == "p" or board[en_passant + NORTH + WEST] == "p":
+            return ZOBRIST_EN_PASSANT_KEYS[color][en_passant]
+    return 0
+
+
+def zobrist_hash(position: Position) -> int:
+    """Calculates a Zobrist hash for the given position using the PolyGlot book format. Only needed to set up a position
+    since make_move() and rotate_position() keep the key up to date afterwards."""
+    board, castling, en_passant, _, color, _, _ = position
+    piece_keys: dict[str, list[int]] = ZOBRIST_PIECE_KEYS[color]
+    key: int = ZOBRIST_TURN_KEY if color == "w" else 0
+    for square, piece in enumerate(board):
+        if piece.isalpha():
+            key ^= piece_keys[piece][square]
+    return key ^ ZOBRIST_CASTLING_KEYS[color][castling] ^ en_passant_key(board, en_passant, color)
+
+
+def all_entries(opening_book: mmap.mmap, key: int, board: str, color: str) -> list[tuple[tuple[int, int, str, str], int]]:
+    """Returns all entries in the PolyGlot opening book for the given position and its Zobrist key."""
     entries: list[tuple[tuple[int, int, str, str], int]] = []
-    for entry_key, raw_move, weight, _ in opening_book:
-        if entry_key == key:
-            endian_start_square: int = (raw_move >> 6) & 0x3f
-            endian_end_square: int = raw_move & 0x3f
-            encoded_promotion_piece: int = (raw_move >> 12) & 0x7
-            start_square: int = 10 * (9 - (endian_start_square // 8)) + (endian_start_square % 8) + 1  # convert to our 10x12 representation
-            end_square: int = 10 * (9 - (endian_end_square // 8)) + (endian_end_square % 8) + 1
-            promotion_piece: str = DECODED_PROMOTION_PIECES[encoded_promotion_piece]
-            if color == "b":  # flip move if from black's perspective
-                start_square = 119 - start_square
-                end_square = 119 - end_square
-            if start_square == 95 or start_square == 94:  # adjust castling since PolyGlot represents it as e1h1 or e1a1 (instead of e1g1 or e1c1)
-                if end_square == H1:
-                    end_square = start_square + 2
-                elif end_square == A1:
-                    end_square = start_square - 2
-            move: tuple[int, int, str, str] = (start_square, end_square, position[end_square], promotion_piece)
-            entries.append((move, weight))
+    for _, raw_move, weight, _ in book_lookup(opening_book, key):
+        entries.append((book_move(*decode_book_move(raw_move), board, color), weight))
     return entries
 
 
-def book_entries(position: str, castling: list[bool], opponent_castling: list[bool], en_passant: int, king_passant: int, color: str) -> tuple[tuple[int, int, str, str], tuple[int, int, str, str]]:
-    """Returns the maximum entry and a random entry by weight from the PolyGlot opening book for the given position."""
+def compiled_entries(compiled_book: mmap.mmap, key: int, board: str, color: str) -> list[tuple[tuple[int, int, str, str], int]]:
+    """Returns all entries in the compiled opening book for the given position and its Zobrist key."""
+    entries: list[tuple[tuple[int, int, str, str], int]] = []
+    for _, start_square, end_square, encoded_promotion_piece, weight in book_lookup(compiled_book, key, COMPILED_BOOK_ENTRY):
+        entries.append((book_move(start_square, end_square, encoded_promotion_piece, board, color), weight))
+    return entries
 
-    total_entries: list[tuple[tuple[int, int, str, str], int]] = []
 
-    for book in OPENING_BOOKS:
-        entries: list[tuple[tuple[int, int, str, str], int]] = all_entries(book, position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-        for new_entry in entries:
-            found: bool = False
-            for i, entry in enumerate(total_entries):
-                if entry[0] == new_entry[0]:
-                    total_entries[i] = (entry[0], entry[1] + new_entry[1]) # combine the weights of all opening books
-                    found = True
-                    break
-            if not found:
-                total_entries.append(new_entry) # add new entries to the list if not already present
+def book_entries(position: Position) -> tuple[tuple[int, int, str, str], tuple[int, int, str, str]]:
+    """Returns the maximum entry and a random entry by weight from the opening book(s) for the given position."""
+    board, _, en_passant, _, color, key, scores = position
+    total_entries: list[tuple[tuple[int, int, str, str], int]]
+    if COMPILED_BOOK is not None:  # a compiled book already has the weights of all its books combined
+        total_entries = compiled_entries(COMPILED_BOOK, key, board, color)
+    else:
+        combined_weights: dict[tuple[int, int, str, str], int] = {}
+        for book in OPENING_BOOKS:
+            for move, weight in all_entries(book, key, board, color):
+                combined_weights[move] = combined_weights.get(move, 0) + weight  # combine the weights of all opening books
+        total_entries = list(combined_weights.items())
 
     if len(total_entries) == 0:
         return (0, 0, "", ""), (0, 0, "", "")
 
-    max_entry: tuple[int, int, str, str] = max(total_entries, key=lambda pair: (pair[1], evaluate_move(pair[0], position, en_passant)))[0]
+    phase: int = scale_phase(scores[2])
+    max_entry: tuple[int, int, str, str] = max(total_entries, key=lambda pair: (pair[1], evaluate_move(pair[0], board, en_passant, phase)))[0]
     weighted_entry: tuple[int, int, str, str] = (0, 0, "", "")
     weight_sum: int = sum([entry[1] for entry in total_entries])
     target: int = random.randint(0, weight_sum)
@@ -846,43 +1624,207 @@ def book_entries(position: str, castling: list[bool], opponent_castling: list[bo
     return max_entry, weighted_entry
 
 
+#######################
+# TRANSPOSITION TABLE #
+#######################
+
+def resize_transposition_table(megabytes: int) -> None:
+    """Allocates an empty transposition table of the given size in megabytes, discarding all entries. When more than
+    one thread is used, the table is allocated in shared memory and the helper processes are restarted to use it."""
+    global TRANSPOSITION_TABLE, TRANSPOSITION_MEMORY, transposition_age
+    close_transposition_table()
+    bucket_count: int = max(1, (megabytes << 20) // (BUCKET_SLOTS * TRANSPOSITION_TABLE.itemsize))
+    table_size: int = bucket_count * BUCKET_SLOTS * TRANSPOSITION_TABLE.itemsize
+    if THREAD_COUNT > 1:
+        TRANSPOSITION_MEMORY = shared_memory.SharedMemory(create=True, size=table_size)
+        TRANSPOSITION_TABLE = TRANSPOSITION_MEMORY.buf[:table_size].cast("Q")  # the shared block may be rounded up to a page
+        clear_transposition_table()
+        start_helper_processes()
+    else:
+        TRANSPOSITION_TABLE = array("Q", bytes(table_size))
+    transposition_age = 0
+
+
+def clear_transposition_table() -> None:
+    """Discards all entries of the transposition table without reallocating it."""
+    global transposition_age
+    TRANSPOSITION_TABLE[:] = array("Q", bytes(len(TRANSPOSITION_TABLE) * TRANSPOSITION_TABLE.itemsize))
+    transposition_age = 0
+
+
+def close_transposition_table() -> None:
+    """Stops the helper and root splitting processes and frees the shared memory of the transposition table, if any."""
+    global TRANSPOSITION_TABLE, TRANSPOSITION_MEMORY
+    stop_helper_processes()
+    stop_root_split_processes()
+    if TRANSPOSITION_MEMORY is not None:
+        TRANSPOSITION_TABLE.release()  # the shared memory can't be closed while a view of it exists
+        TRANSPOSITION_TABLE = array("Q")
+        TRANSPOSITION_MEMORY.close()
+        TRANSPOSITION_MEMORY.unlink()
+        TRANSPOSITION_MEMORY = None
+
+
+def resize_evaluation_cache(megabytes: int) -> None:
+    """Allocates an empty evaluation cache of the given size in megabytes."""
+    global EVALUATION_CACHE
+    entry_count: int = max(1, (megabytes << 20) // (2 * EVALUATION_CACHE.itemsize))
+    EVALUATION_CACHE = array("Q", bytes(entry_count * 2 * EVALUATION_CACHE.itemsize))
+
+
+def pack_move(move: tuple[int, int, str, str]) -> int:
+    """Packs a move into 20 bits: start square, end square, piece captured and promotion piece."""
+    return move[0] | (move[1] << 7) | (MOVE_CAPTURED_PIECES.index(move[2]) << 14) | (MOVE_PROMOTION_PIECES.index(move[3]) << 17)
+
+
+def unpack_move(packed_move: int) -> tuple[int, int, str, str]:
+    """Unpacks a move packed by pack_move()."""
+    return packed_move & 127, (packed_move >> 7) & 127, MOVE_CAPTURED_PIECES[(packed_move >> 14) & 7], MOVE_PROMOTION_PIECES[(packed_move >> 17) & 7]
+
+
+def transposition_lookup(key: int) -> tuple[tuple[int, int, str, str], int, int, int] | None:
+    """Looks up a position in the transposition table, returning (best_move, depth, score, bound) if it is found."""
+    index: int = (key % (len(TRANSPOSITION_TABLE) // BUCKET_SLOTS)) * BUCKET_SLOTS
+    for slot in (index, index + 2):
+        data: int = TRANSPOSITION_TABLE[slot + 1]
+        if TRANSPOSITION_TABLE[slot] ^ data == key:
+            if data != 0:
+                return unpack_move(data & 0xFFFFF), (data >> 20) & 255, (data >> 36) - SCORE_OFFSET, (data >> 28) & 3
+    return None
+
+
+def transposition_store(key: int, move: tuple[int, int, str, str], depth: int, score: int, bound: int) -> None:
+    """Stores a position in the transposition table. The depth-preferred entry of the bucket is replaced if it holds the
+    same position, comes from an earlier search or was searched less deeply, otherwise the always-replace entry is."""
+    index: int = (key % (len(TRANSPOSITION_TABLE) // BUCKET_SLOTS)) * BUCKET_SLOTS
+    stored_data: int = TRANSPOSITION_TABLE[index + 1]
+    if TRANSPOSITION_TABLE[index] ^ stored_data != key and (stored_data >> 30) & 63 == transposition_age and (stored_data >> 20) & 255 > depth:
+        index += 2
+    data: int = pack_move(move) | (min(depth, 255) << 20) | (bound << 28) | (transposition_age << 30) | ((score + SCORE_OFFSET) << 36)
+    TRANSPOSITION_TABLE[index] = key ^ data
+    TRANSPOSITION_TABLE[index + 1] = data
+
+
+def transposition_cutoff(score: int, bound: int, alpha: int, beta: int) -> int | None:
+    """Returns the score a transposition table entry searched deeply enough proves for the given window, or None if its
+    bound doesn't allow cutting the search off."""
+    if bound == EXACT_BOUND:
+        return min(max(score, alpha), beta)
+    if bound == LOWER_BOUND and score >= beta:
+        return beta
+    if bound == UPPER_BOUND and score <= alpha:
+        return alpha
+    return None
+
+
+def hashfull() -> int:
+    """Estimates how full the transposition table is in permill from the entries of the current search among the first
+    thousand entries."""
+    sample_slots: int = min(len(TRANSPOSITION_TABLE), 2000)
+    used_entries: int = 0
+    for slot in range(1, sample_slots, 2):
+        data: int = TRANSPOSITION_TABLE[slot]
+        if data != 0 and (data >> 30) & 63 == transposition_age:
+            used_entries += 1
+    return used_entries * 1000 // max(1, sample_slots // 2)
+
+
+#################
+# MOVE ORDERING #
+#################
+
+def clear_move_ordering() -> None:
+    """Empties the killer, history and counter move tables."""
+    KILLER_MOVES.clear()
+    HISTORY_TABLE[:] = [0] * len(HISTORY_TABLE)
+    COUNTER_MOVES[:] = [(0, 0, "", "")] * len(COUNTER_MOVES)
+
+
+def age_move_ordering(depth: int) -> None:
+    """Prepares the move ordering tables for a new search to the given depth: killer moves are relative to the root so
+    they are reset, while history scores are halved so that recent cutoffs count more. Counter moves are kept."""
+    KILLER_MOVES[:] = [[(0, 0, "", ""), (0, 0, "", "")] for _ in range(depth + 1)]
+    HISTORY_TABLE[:] = [score // 2 for score in HISTORY_TABLE]
+
+
+def update_move_ordering(move: tuple[int, int, str, str], depth: int, ply: int, previous_move: tuple[int, int, str, str]) -> None:
+    """Records a quiet move that caused a beta cutoff as a killer move, in the history table and as the counter move to
+    the opponent's last move."""
+    killers: list[tuple[int, int, str, str]] = KILLER_MOVES[ply]
+    if killers[0] != move:
+        killers[1] = killers[0]
+        killers[0] = move
+    HISTORY_TABLE[move[0] * 120 + move[1]] += depth * depth  # cutoffs close to the root save the most work
+    COUNTER_MOVES[previous_move[0] * 120 + previous_move[1]] = move
+
+
+###################
+# TIME MANAGEMENT #
+###################
+
+def allocate_time(remaining_time: float, increment: float, moves_to_go: int | None) -> tuple[float, float]:
+    """Splits the remaining clock time (in seconds) over the moves left until the next time control, returning the soft
+    and hard time limits of the search. The move overhead is kept in reserve."""
+    remaining_time = max(remaining_time - MOVE_OVERHEAD / 1000, 0)
+    soft_limit: float = remaining_time / (moves_to_go if moves_to_go else DEFAULT_MOVES_TO_GO) + increment / 2
+    hard_limit: float = max(min(soft_limit * HARD_TIME_FACTOR, remaining_time * MAX_TIME_FRACTION), MIN_TIME_LIMIT)
+    return min(soft_limit, hard_limit), hard_limit
+
+
+def clock_expired() -> bool:
+    """Checks whether the search has to stop because of the "stop" command, the hard time limit or the node limit.
+    Reading the clock is relatively slow, so the search only calls this every CLOCK_CHECK_INTERVAL nodes. The limits
+    only apply after the first iteration, which is needed to have a legal best move however short they are."""
+    global next_clock_check
+    next_clock_check = min(nodes + CLOCK_CHECK_INTERVAL, node_limit)
+    return SEARCH_STOP.is_set() or (max_depth > 1 and (time.monotonic() - start_time > time_limit or nodes >= node_limit))
+
+
+def iteration_fits(iteration_time: float, branching_factor: float) -> bool:
+    """Decides whether to start the next iteration: not after the soft time limit, nor when its cost predicted from the
+    last iteration's time and the branching factor wouldn't fit before the hard time limit (since an unfinished
+    iteration is thrown away)."""
+    elapsed: float = time.monotonic() - start_time
+    return elapsed < soft_time_limit and elapsed + iteration_time * branching_factor <= time_limit
+
+
 ################
 # SEARCH LOGIC #
 ################
 
-def quiesce(alpha: int, beta: int, position: str, castling: list[bool], opponent_castling: list[bool], en_passant: int, king_passant: int, color: str) -> int:
+def quiesce(alpha: int, beta: int, position: Position) -> int:
     """Performs a fail-hard quiescent search (searches captures only until a quiet position is reached) with delta
-    pruning."""
-    global nodes, start_time, time_limit, timeout
-    if time.time() - start_time > time_limit:
+    pruning, captures that lose material according to static_exchange() are skipped."""
+    global nodes, timeout
+    if nodes >= next_clock_check and clock_expired():
         timeout = True
         return alpha
 
     nodes += 1
-    stand_pat: int = evaluate_position(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
+    if COLLECT_STATISTICS:
+        STATISTICS["quiescence_nodes"] += 1
+    stand_pat: int = evaluate_position(position)
     if stand_pat >= beta:
         return stand_pat
 
     if alpha < stand_pat:
         alpha = stand_pat
-    move_list: list[tuple[int, int, str, str]] = generate_moves(position, castling[:], en_passant)
-    for move in move_list:
-        if not move[2].islower():  # not a capture
-            continue
-        new_position: tuple[str, list[bool], list[bool], int, int, str] = make_move(move, position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-        new_position = rotate_position(*new_position)
-        if king_in_check(new_position[0], castling[:], new_position[4]): # if the move results in our king being in check (illegal move)
-            continue
+    for move in generate_captures(position.board):
         delta: int = 200  # delta safety margin to account for potential positional compensation
         if stand_pat + ENDGAME_PIECE_VALUES[move[2].upper()] + (ENDGAME_PIECE_VALUES[move[3]] if move[3].isupper() else 0) + delta < alpha:  # delta pruning
             continue
-        key: int = zobrist_hash(*new_position)
-        if REPETITION_TABLE.get(key) is None:
-            REPETITION_TABLE[key] = 1
+        if losing_capture(position.board, move):  # e.g. a queen taking a defended pawn, the exchange is lost before it starts
+            continue
+        new_position: Position = rotate_position(make_move(move, position))
+        if king_in_check(new_position.board, new_position.king_passant): # if the move results in our king being in check (illegal move)
+            continue
+        new_key: int = new_position.key
+        if REPETITION_TABLE.get(new_key) is None:
+            REPETITION_TABLE[new_key] = 1
         else:
-            REPETITION_TABLE[key] += 1
-        score = -quiesce(-beta, -alpha, *new_position)
-        REPETITION_TABLE[key] -= 1
+            REPETITION_TABLE[new_key] += 1
+        score = -quiesce(-beta, -alpha, new_position)
+        REPETITION_TABLE[new_key] -= 1
 
         if score >= beta:
             return beta # fail-hard beta cutoff
@@ -896,47 +1838,101 @@ def quiesce(alpha: int, beta: int, position: str, castling: list[bool], opponent
     return alpha
 
 
-def nega_max(depth: int, alpha: int, beta: int, position: str, castling: list[bool], opponent_castling: list[bool], en_passant: int, king_passant: int, color: str) -> tuple[int, tuple[int, int, str, str]]:
+def nega_max(depth: int, alpha: int, beta: int, position: Position, allow_null: bool = True, ply: int = 0, previous_move: tuple[int, int, str, str] = (0, 0, "", "")) -> tuple[int, tuple[int, int, str, str]]:
     """Performs a fail-hard negamax search with alpha-beta pruning on the given position, returning the best score and
-    move found after the search."""
-    global max_depth, nodes, start_time, time_limit, timeout
-    if time.time() - start_time > time_limit:
+    move found after the search. Moves after the first are searched with a null window around alpha (principal
+    variation search) and only searched again with the full window if they turn out to be better. Away from the root,
+    the static evaluation is used for razoring, null-move pruning
+    (not twice in a row, as allow_null is False after a null move) and futility pruning, and late quiet moves are
+    searched with a reduced depth first. Quiet moves causing a beta cutoff are remembered for move ordering, the ply
+    (distance from the root) and previous_move index the killer and counter move tables."""
+    global max_depth, nodes, timeout
+    if nodes >= next_clock_check and clock_expired():
         timeout = True
         return alpha, (0, 0, "", "")
 
     if depth == 0:
-        return quiesce(alpha, beta, position, castling[:], opponent_castling[:], en_passant, king_passant, color), (0, 0, "", "")
-
-    key: int = zobrist_hash(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-    table_info: tuple[tuple[int, int, str, str], int, int] | None = TRANSPOSITION_TABLE.get(key)
-    if table_info is None:
-        table_info = ((0, 0, "", ""), -1, 0)
-    if table_info[1] >= depth or table_info[2] >= CHECKMATE_LOWER:  # move is from higher depth or position is checkmate
-        return table_info[2], table_info[0]
+        return quiesce(alpha, beta, position), (0, 0, "", "")
+
+    key: int = position.key
+    hash_move: tuple[int, int, str, str] = (0, 0, "", "")
+    table_info: tuple[tuple[int, int, str, str], int, int, int] | None = transposition_lookup(key)
+    if COLLECT_STATISTICS:
+        STATISTICS["tt_probes"] += 1
+        STATISTICS["tt_hits"] += table_info is not None
+    if table_info is not None:
+        hash_move, table_depth, table_score, table_bound = table_info
+        if table_depth >= depth or table_score >= CHECKMATE_LOWER:  # entry is from higher depth or position is checkmate
+            table_cutoff: int | None = transposition_cutoff(table_score, table_bound, alpha, beta)
+            if table_cutoff is not None:
+                if COLLECT_STATISTICS:
+                    STATISTICS["tt_cutoffs"] += 1
+                return table_cutoff, hash_move
 
     nodes += 1
+    if COLLECT_STATISTICS:
+        STATISTICS["main_nodes"] += 1
+    board: str = position.board
+    in_check: bool = side_in_check(board)
+    static_eval: int | None = None  # only known at nodes where the selective search applies
+    if not in_check and depth != max_depth:
+        static_eval = evaluate_position(position)
+        # Pruning on the static evaluation could miss a faster mate, so it is skipped once a mate has been found
+        if SELECTIVE_SEARCH["Razoring"] and depth < len(RAZOR_MARGINS) and static_eval + RAZOR_MARGINS[depth] <= alpha < CHECKMATE_LOWER:  # hopeless even with a margin, see if a capture saves it
+            if quiesce(alpha, beta, position) <= alpha:
+                return alpha, (0, 0, "", "")
+        # Giving the opponent a free move and still failing high means that our position is very likely good enough,
+        # unless we only have pawns left, where zugzwang (any move making the position worse) is common
+        if SELECTIVE_SEARCH["NullMove"] and allow_null and depth >= NULL_MOVE_MIN_DEPTH and static_eval >= beta and -CHECKMATE_LOWER < beta < CHECKMATE_LOWER and any(piece in board for piece in "NBRQ"):
+            null_position: Position = rotate_position(make_null_move(position))
+            score: int = -nega_max(depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, null_position, allow_null=False, ply=ply + 1)[0]
+            if timeout:
+                return alpha, (0, 0, "", "")
+            if score >= beta:
+                return beta, hash_move
+
     legal_moves: list[tuple[int, int, str, str]] = []  # keep track of legal moves for checkmate and stalemate detection
-    move_list: list[tuple[int, int, str, str]] = generate_moves(position, castling[:], en_passant)
-    for i in range(len(move_list)):  # basic PV move ordering: transposition table move from lower depth goes first
-        if move_list[i] == table_info[0]:
-            move_list.insert(0, move_list.pop(i))
-            break
     best_move: tuple[int, int, str, str] = (0, 0, "", "")
-    for move in move_list:
-        new_position: tuple[str, list[bool], list[bool], int, int, str] = make_move(move, position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-        new_position = rotate_position(*new_position)
-        if king_in_check(new_position[0], castling[:], new_position[4]):  # if the move results in our king being in check (illegal move)
+    moves_searched: int = 0  # legal moves minus the ones pruned by futility pruning
+    for move in ordered_moves(position, hash_move, KILLER_MOVES[ply], COUNTER_MOVES[previous_move[0] * 120 + previous_move[1]]):  # transposition table move from lower depth goes first
+        moved_position: Position = make_move(move, position)
+        new_position: Position = rotate_position(moved_position)
+        if king_in_check(new_position.board, new_position.king_passant):  # if the move results in our king being in check (illegal move)
             continue
         legal_moves.append(move)
-        key: int = zobrist_hash(*new_position)
-        if REPETITION_TABLE.get(key) is None:
-            REPETITION_TABLE[key] = 1
+        reduction: int = 0
+        quiet: bool = move[2] == "." and move[3] == "" and not (board[move[0]] == "P" and move[1] == position.en_passant)
+        if quiet and not in_check:
+            futile: bool = SELECTIVE_SEARCH["Futility"] and static_eval is not None and depth < len(FUTILITY_MARGINS) and static_eval + FUTILITY_MARGINS[depth] <= alpha < CHECKMATE_LOWER
+            late: bool = SELECTIVE_SEARCH["LateMoveReductions"] and depth >= LMR_MIN_DEPTH and len(legal_moves) > LMR_FULL_DEPTH_MOVES
+            if (futile or late) and not is_square_attacked(moved_position.board, moved_position.board.find("k")):  # checks are never pruned or reduced
+                if futile:
+                    continue
+                reduction = 1
+        new_key: int = new_position.key
+        if REPETITION_TABLE.get(new_key) is None:
+            REPETITION_TABLE[new_key] = 1
         else:
-            REPETITION_TABLE[key] += 1
-        score: int = -nega_max(depth - 1, -beta, -alpha, *new_position)[0]
-        REPETITION_TABLE[key] -= 1
+            REPETITION_TABLE[new_key] += 1
+        if moves_searched == 0:  # the first move is expected to be the best one so it gets the full window
+            score = -nega_max(depth - 1, -beta, -alpha, new_position, ply=ply + 1, previous_move=move)[0]
+        else:  # the null window only proves whether the move beats alpha, which is cheaper than finding its score
+            score = -nega_max(depth - 1 - reduction, -alpha - 1, -alpha, new_position, ply=ply + 1, previous_move=move)[0]
+            if reduction > 0 and score > alpha and not timeout:  # the reduced search was wrong about the move, verify it at full depth
+                score = -nega_max(depth - 1, -alpha - 1, -alpha, new_position, ply=ply + 1, previous_move=move)[0]
+            if alpha < score < beta and not timeout:
+                score = -nega_max(depth - 1, -beta, -alpha, new_position, ply=ply + 1, previous_move=move)[0]
+        moves_searched += 1
+        REPETITION_TABLE[new_key] -= 1
 
         if score >= beta:
+            if not timeout:
+                transposition_store(key, move, depth, beta, LOWER_BOUND)
+                if quiet:
+                    update_move_ordering(move, depth, ply, previous_move)
+                if COLLECT_STATISTICS:
+                    STATISTICS["beta_cutoffs"] += 1
+                    STATISTICS["first_move_cutoffs"] += moves_searched == 1
             return beta, move  # fail-hard beta cutoff
 
         if score > alpha:
@@ -947,63 +1943,344 @@ def nega_max(depth: int, alpha: int, beta: int, position: str, castling: list[bo
             return alpha, best_move
 
     if len(legal_moves) == 0:  # if there are no legal moves, it's either checkmate or stalemate.
-        new_position = rotate_position(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-        if king_in_check(new_position[0], castling[:], 0):
+        if in_check:
             return -CHECKMATE_LOWER + max_depth - depth, (0, 0, "", "")
 
         else:
             return 0, (0, 0, "", "")
 
     if best_move != (0, 0, "", ""):
-        key: int = zobrist_hash(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-        TRANSPOSITION_TABLE[key] = (best_move, depth, alpha)
+        transposition_store(key, best_move, depth, alpha, EXACT_BOUND)
+    else:  # no move raised alpha, keep the previous best move for move ordering
+        transposition_store(key, hash_move, depth, alpha, UPPER_BOUND)
     return alpha, best_move
 
 
-def iteratively_deepen(depth: int, position: str, castling: list[bool], opponent_castling: list[bool], en_passant: int, king_passant: int, color: str) -> tuple[int, int, str, str]:
+def iteratively_deepen(depth: int, position: Position, split_root: bool = False) -> tuple[int, int, str, str]:
     """Wraps the negamax search function in an iterative deepening loop, utilizing the transposition table and PV move
-    ordering to improve search efficiency."""
-    global max_depth, nodes, start_time, timeout
+    ordering to improve search efficiency. With split_root, the root moves are searched by a pool of processes
+    instead (see root_split_search())."""
+    global max_depth, nodes, start_time, timeout, transposition_age, next_clock_check, completed_iteration
+    start_time = time.monotonic()  # the book probe is part of the time spent on the move
+    completed_iteration = (0, 0, [])
     weighted_entry: tuple[int, int, str, str]
-    _, weighted_entry = book_entries(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
+    _, weighted_entry = book_entries(position)
     if weighted_entry != (0, 0, "", ""):
         send_response(f"info string weighted bookmove")
         return weighted_entry
 
     # max_entry: tuple[int, int, str, str]
-    # max_entry, _ = book_entries(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
+    # max_entry, _ = book_entries(position)
     # if max_entry != (0, 0, "", ""):
     #     send_response(f"info string max bookmove")
     #     return max_entry
 
+    if split_root and THREAD_COUNT > 1:
+        return root_split_search(depth, position)
+
     score: int = 0
     best_move: tuple[int, int, str, str] = (0, 0, "", "")
     previous_best_move: tuple[int, int, str, str] = (0, 0, "", "")
-    start_time = time.time()
+    completed_depth: int = 0
+    previous_iteration_nodes: int = 0
     timeout = False
+    nodes = 0  # counted over the whole search
+    next_clock_check = 0
+    transposition_age = (transposition_age + 1) % 64  # entries from earlier searches are replaced first
+    age_move_ordering(depth)
+    start_helper_search(depth, position)
     for max_depth in range(1, depth + 1):
-        nodes = 0
-        score, best_move = nega_max(max_depth, -CHECKMATE_UPPER, CHECKMATE_UPPER, position, castling[:], opponent_castling[:], en_passant, king_passant, color)
+        iteration_start: float = time.monotonic()
+        iteration_start_nodes: int = nodes
+        alpha: int = -CHECKMATE_UPPER
+        beta: int = CHECKMATE_UPPER
+        window: int = ASPIRATION_WINDOW
+        if max_depth > 1 and abs(score) < CHECKMATE_LOWER:
+            alpha, beta = score - window, score + window
+        previous_score: int = score
+        while True:
+            score, best_move = nega_max(max_depth, alpha, beta, position)
+            if timeout:
+                break
+            # Fail-hard scores on a bound don't tell how far outside of the window the real score is
+            if score <= alpha and alpha > -CHECKMATE_UPPER:
+                window *= ASPIRATION_GROWTH
+                alpha = previous_score - window if window <= MAX_ASPIRATION_WINDOW else -CHECKMATE_UPPER
+            elif score >= beta and beta < CHECKMATE_UPPER:
+                window *= ASPIRATION_GROWTH
+                beta = previous_score + window if window <= MAX_ASPIRATION_WINDOW else CHECKMATE_UPPER
+            else:
+                break
         if timeout:
             timeout = False
             best_move = previous_best_move
             break
-        pv_string: str = ""
-        for i, move in enumerate(principal_variation(max_depth, position, castling[:], opponent_castling[:], en_passant, king_passant, color)):
-            if i % 2 == 0:
-                pv_string += algebraic_notation(move, color) + " "
-            else:
-                pv_string += algebraic_notation(move, ("b" if color == "w" else "w")) + " "
-        send_response(f"info depth {max_depth} score cp {score * (-1 if color == 'b' else 1)} nodes {nodes} time {int(round(time.time() - start_time, 3) * 1000)} pv {pv_string.rstrip()}")
+        completed_depth = max_depth
+        send_search_info(max_depth, score, nodes + helper_nodes(), position)
         if best_move == (0, 0, "", ""):
             break
         previous_best_move = best_move
+        iteration_nodes: int = nodes - iteration_start_nodes
+        branching_factor: float = iteration_nodes / previous_iteration_nodes if previous_iteration_nodes > 0 else DEFAULT_BRANCHING_FACTOR
+        previous_iteration_nodes = iteration_nodes
+        if max_depth < depth and not iteration_fits(time.monotonic() - iteration_start, branching_factor):
+            break
+    helper_depth, helper_score, helper_move = stop_helper_search()
+    if helper_depth > completed_depth and helper_move != (0, 0, "", ""):  # a helper completed a deeper iteration
+        best_move = helper_move
+        send_search_info(helper_depth, helper_score, nodes + helper_nodes(), position)
+
+    move_list: list[tuple[int, int, str, str]] = generate_moves(position)
+    if best_move not in move_list:  # stopped during the first iteration, play any legal move
+        for move in move_list:
+            new_position: Position = rotate_position(make_move(move, position))
+            if not king_in_check(new_position.board, new_position.king_passant):
+                return move
+
+    return best_move
 
-    # hackish bug fix?
-    move_list: list[tuple[int, int, str, str]] = generate_moves(position, castling[:], en_passant)
-    if len(move_list) != 0 and best_move not in move_list:
-        return move_list[0]
 
+def send_search_info(depth: int, score: int, node_count: int, position: Position) -> None:
+    """Sends the result of a completed iteration with the principal variation from the transposition table, and keeps
+    it as completed_iteration since later (interrupted or re-searched) iterations overwrite the root entry."""
+    global completed_iteration
+    color: str = position.color
+    pv: list[tuple[int, int, str, str]] = principal_variation(depth, position)
+    completed_iteration = (depth, score, pv)
+    if COLLECT_STATISTICS:
+        STATISTICS_ITERATIONS.append((depth, node_count))
+    pv_string: str = ""
+    for i, move in enumerate(pv):
+        if i % 2 == 0:
+            pv_string += algebraic_notation(move, color) + " "
+        else:
+            pv_string += algebraic_notation(move, ("b" if color == "w" else "w")) + " "
+    send_response(f"info depth {depth} score cp {score * (-1 if color == 'b' else 1)} nodes {node_count} time {int(round(time.monotonic() - start_time, 3) * 1000)} hashfull {hashfull()} pv {pv_string.rstrip()}")
+
+
+def ponder_move(best_move: tuple[int, int, str, str], position: Position) -> tuple[int, int, str, str]:
+    """Finds the opponent's expected reply to the best move from the principal variation in the transposition table,
+    returning the null move if there is no legal reply stored."""
+    if best_move == (0, 0, "", ""):
+        return (0, 0, "", "")
+    new_position: Position = rotate_position(make_move(best_move, position))
+    table_info: tuple[tuple[int, int, str, str], int, int, int] | None = transposition_lookup(new_position.key)
+    if table_info is None or table_info[0] not in generate_moves(new_position):
+        return (0, 0, "", "")
+    reply_position: Position = rotate_position(make_move(table_info[0], new_position))
+    if king_in_check(reply_position.board, reply_position.king_passant):  # stored move is illegal
+        return (0, 0, "", "")
+    return table_info[0]
+
+
+############
+# LAZY SMP #
+############
+
+def start_helper_processes() -> None:
+    """Starts a helper process for every thread other than the main one, attached to the shared transposition table."""
+    global HELPER_STOP, HELPER_DONE, HELPER_RESULTS
+    stop_helper_processes()
+    if THREAD_COUNT <= 1 or TRANSPOSITION_MEMORY is None:
+        return
+    HELPER_STOP = MULTIPROCESSING_CONTEXT.Event()
+    HELPER_DONE = MULTIPROCESSING_CONTEXT.Queue()
+    HELPER_RESULTS = MULTIPROCESSING_CONTEXT.RawArray("q", (THREAD_COUNT - 1) * HELPER_RESULT_SLOTS)
+    for index in range(THREAD_COUNT - 1):
+        task_queue: multiprocessing.Queue = MULTIPROCESSING_CONTEXT.Queue()
+        process: multiprocessing.Process = MULTIPROCESSING_CONTEXT.Process(target=helper_loop, args=(index, TRANSPOSITION_MEMORY.name, EVALUATION_CACHE_SIZE, EVALUATION_PARAMETERS_FILE, task_queue, HELPER_DONE, HELPER_STOP, HELPER_RESULTS), daemon=True)
+        process.start()
+        HELPERS.append((process, task_queue))
+
+
+def stop_helper_processes() -> None:
+    """Shuts down the helper processes, waiting for them to exit."""
+    for _, task_queue in HELPERS:
+        task_queue.put(None)
+    for process, _ in HELPERS:
+        process.join()
+    HELPERS.clear()
+
+
+def helper_loop(index: int, memory_name: str, evaluation_cache_size: int, parameters_file: str, task_queue: multiprocessing.Queue, done_queue: multiprocessing.Queue, stop_event: multiprocessing.Event, results: multiprocessing.Array) -> None:
+    """Main loop of a helper process: waits for a position from the main process and searches it with iterative
+    deepening until the main process stops it, publishing its node count and deepest completed iteration. Helpers
+    attach to the shared transposition table instead of allocating their own and never probe the opening books."""
+    global TRANSPOSITION_TABLE, TRANSPOSITION_MEMORY, SEARCH_STOP, max_depth, nodes, start_time, time_limit, timeout, transposition_age, next_clock_check
+    initialize_evaluation(parameters_file)
+    resize_evaluation_cache(evaluation_cache_size)
+    reset_search_state()
+    TRANSPOSITION_MEMORY = shared_memory.SharedMemory(name=memory_name)
+    TRANSPOSITION_TABLE = TRANSPOSITION_MEMORY.buf[:len(TRANSPOSITION_MEMORY.buf) // 8 * 8].cast("Q")
+    SEARCH_STOP = stop_event
+    slot: int = index * HELPER_RESULT_SLOTS
+    while True:
+        task: tuple | None = task_queue.get()
+        if task is None:
+            break
+        depth, transposition_age, repetitions, selective_search, position = task
+        SELECTIVE_SEARCH.update(selective_search)
+        age_move_ordering(depth)
+        REPETITION_TABLE.clear()
+        REPETITION_TABLE.update(repetitions)
+        nodes = 0
+        next_clock_check = 0
+        start_time = time.monotonic()
+        time_limit = float("inf")
+        timeout = False
+        # Helpers with an even index skip the first iteration so that the processes are spread over different depths
+        for max_depth in range(1 + (index + 1) % 2, depth + 1):
+            score, best_move = nega_max(max_depth, -CHECKMATE_UPPER, CHECKMATE_UPPER, position)
+            if timeout:
+                break
+            results[slot:slot + HELPER_RESULT_SLOTS] = [nodes, max_depth, score, pack_move(best_move)]
+        results[slot] = nodes
+        done_queue.put(index)
+    TRANSPOSITION_TABLE.release()
+    TRANSPOSITION_MEMORY.close()
+
+
+def start_helper_search(depth: int, position: Position) -> None:
+    """Sends the position being searched to every helper process."""
+    if not HELPERS:
+        return
+    HELPER_RESULTS[:] = [0] * len(HELPER_RESULTS)
+    HELPER_STOP.clear()
+    for _, task_queue in HELPERS:
+        task_queue.put((depth, transposition_age, REPETITION_TABLE, SELECTIVE_SEARCH, position))
+
+
+def stop_helper_search() -> tuple[int, int, tuple[int, int, str, str]]:
+    """Stops the helper processes' search and returns the deepest iteration completed by any of them as (depth, score,
+    best_move)."""
+    if not HELPERS:
+        return 0, 0, (0, 0, "", "")
+    HELPER_STOP.set()
+    for _ in HELPERS:
+        HELPER_DONE.get()
+    best_result: tuple[int, int, tuple[int, int, str, str]] = (0, 0, (0, 0, "", ""))
+    for slot in range(0, len(HELPER_RESULTS), HELPER_RESULT_SLOTS):
+        if HELPER_RESULTS[slot + 1] > best_result[0]:
+            best_result = (HELPER_RESULTS[slot + 1], HELPER_RESULTS[slot + 2], unpack_move(HELPER_RESULTS[slot + 3]))
+    return best_result
+
+
+def helper_nodes() -> int:
+    """Returns the number of nodes searched by the helper processes in the current search."""
+    if not HELPERS:
+        return 0
+    return sum(HELPER_RESULTS[slot] for slot in range(0, len(HELPER_RESULTS), HELPER_RESULT_SLOTS))
+
+
+##################
+# ROOT SPLITTING #
+##################
+
+def start_root_split_processes() -> concurrent.futures.ProcessPoolExecutor:
+    """Returns the pool of root splitting processes, starting it with one process per thread if needed."""
+    global ROOT_SPLIT_EXECUTOR, ROOT_SPLIT_STOP
+    if ROOT_SPLIT_EXECUTOR is None:
+        ROOT_SPLIT_STOP = MULTIPROCESSING_CONTEXT.Event()
+        ROOT_SPLIT_EXECUTOR = concurrent.futures.ProcessPoolExecutor(max_workers=THREAD_COUNT, mp_context=MULTIPROCESSING_CONTEXT, initializer=root_split_initializer, initargs=(HASH_SIZE, EVALUATION_CACHE_SIZE, EVALUATION_PARAMETERS_FILE, ROOT_SPLIT_STOP))
+    return ROOT_SPLIT_EXECUTOR
+
+
+def stop_root_split_processes() -> None:
+    """Shuts down the pool of root splitting processes, if any."""
+    global ROOT_SPLIT_EXECUTOR
+    if ROOT_SPLIT_EXECUTOR is not None:
+        ROOT_SPLIT_STOP.set()
+        ROOT_SPLIT_EXECUTOR.shutdown(cancel_futures=True)
+        ROOT_SPLIT_EXECUTOR = None
+
+
+def root_split_initializer(hash_size: int, evaluation_cache_size: int, parameters_file: str, stop_event: multiprocessing.Event) -> None:
+    """Sets up a root splitting process, which keeps its own transposition table warm between root moves and never
+    probes the opening books."""
+    global SEARCH_STOP
+    initialize_evaluation(parameters_file)
+    resize_transposition_table(hash_size)
+    resize_evaluation_cache(evaluation_cache_size)
+    reset_search_state()
+    SEARCH_STOP = stop_event
+
+
+def search_root_move(depth: int, alpha: int, age: int, move: tuple[int, int, str, str], repetitions: dict[int, int], selective_search: dict[str, bool], position: Position) -> tuple[tuple[int, int, str, str], int, int, list[tuple[int, int, str, str]]]:
+    """Searches a single root move in a root splitting process with the given lower bound, returning (move, score,
+    nodes, principal_variation)."""
+    global max_depth, nodes, start_time, time_limit, timeout, transposition_age, next_clock_check
+    REPETITION_TABLE.clear()
+    REPETITION_TABLE.update(repetitions)
+    SELECTIVE_SEARCH.update(selective_search)
+    max_depth = depth  # mate scores are relative to the root
+    nodes = 0
+    next_clock_check = 0
+    start_time = time.monotonic()
+    time_limit = float("inf")
+    timeout = False
+    if age != transposition_age or len(KILLER_MOVES) <= depth:  # first root move of a new search in this process
+        age_move_ordering(depth)
+    transposition_age = age
+    new_position: Position = rotate_position(make_move(move, position))
+    REPETITION_TABLE[new_position.key] = REPETITION_TABLE.get(new_position.key, 0) + 1
+    score: int = -nega_max(depth - 1, -CHECKMATE_UPPER, -alpha, new_position, ply=1, previous_move=move)[0]
+    return move, score, nodes, [move] + principal_variation(depth - 1, new_position)
+
+
+def root_split_search(depth: int, position: Position) -> tuple[int, int, str, str]:
+    """Iterative deepening where each iteration spreads the root moves over a pool of processes. The best move so far
+    is searched first to get a lower bound, then the other moves are handed out as processes become free, each with
+    the best score found so far as alpha. The principal variation is stored in the transposition table."""
+    global max_depth, nodes, start_time, timeout, transposition_age
+    executor: concurrent.futures.ProcessPoolExecutor = start_root_split_processes()
+    ROOT_SPLIT_STOP.clear()
+    start_time = time.monotonic()
+    nodes = 0
+    transposition_age = (transposition_age + 1) % 64
+    root_moves: list[tuple[int, int, str, str]] = []
+    for move in generate_moves(position):
+        new_position: Position = rotate_position(make_move(move, position))
+        if not king_in_check(new_position.board, new_position.king_passant):
+            root_moves.append(move)
+    if len(root_moves) == 0:
+        return (0, 0, "", "")
+
+    best_move: tuple[int, int, str, str] = root_moves[0]
+    for max_depth in range(1, depth + 1):
+        alpha: int = -CHECKMATE_UPPER
+        iteration_move: tuple[int, int, str, str] = root_moves[0]
+        iteration_pv: list[tuple[int, int, str, str]] = [root_moves[0]]
+        move_scores: dict[tuple[int, int, str, str], int] = {}
+        waiting_moves: list[tuple[int, int, str, str]] = root_moves[1:]
+        pending: set[concurrent.futures.Future] = {executor.submit(search_root_move, max_depth, alpha, transposition_age, root_moves[0], REPETITION_TABLE, SELECTIVE_SEARCH, position)}
+        while pending:
+            if SEARCH_STOP.is_set():
+                ROOT_SPLIT_STOP.set()
+            finished, pending = concurrent.futures.wait(pending, timeout=0.01, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                move, score, move_nodes, move_pv = future.result()
+                nodes += move_nodes
+                move_scores[move] = score
+                if score > alpha:
+                    alpha = score
+                    iteration_move = move
+                    iteration_pv = move_pv
+            if len(move_scores) > 0 and not ROOT_SPLIT_STOP.is_set():  # the first move has given us a bound
+                while waiting_moves and len(pending) < THREAD_COUNT:
+                    pending.add(executor.submit(search_root_move, max_depth, alpha, transposition_age, waiting_moves.pop(0), REPETITION_TABLE, SELECTIVE_SEARCH, position))
+        if ROOT_SPLIT_STOP.is_set():  # the iteration was interrupted, keep the result of the previous one
+            break
+        best_move = iteration_move
+        root_moves.sort(key=lambda move: move_scores[move], reverse=True)
+        root_moves.remove(best_move)
+        root_moves.insert(0, best_move)
+        # Store the principal variation so that it can be reported and pondered on
+        pv_position: Position = position
+        for ply, move in enumerate(iteration_pv):
+            transposition_store(pv_position.key, move, max_depth - ply, alpha if ply % 2 == 0 else -alpha, EXACT_BOUND)
+            pv_position = rotate_position(make_move(move, pv_position))
+        send_search_info(max_depth, alpha, nodes, position)
+    timeout = False
     return best_move
 
 
@@ -1038,7 +2315,7 @@ def algebraic_notation(move: tuple[int, int, str, str], color: str) -> str:
     return render_coordinates(start_square) + render_coordinates(end_square) + promotion_piece.lower()
 
 
-def load_fen(fen: str) -> tuple[str, list[bool], list[bool], int, int, str]:
+def load_fen(fen: str) -> Position:
     """Configures the board according to the given FEN string and returns the position information."""
     list_position: list[str] = [" "] * 120
     fields: list[str] = fen.split(" ")
@@ -1055,27 +2332,25 @@ def load_fen(fen: str) -> tuple[str, list[bool], list[bool], int, int, str]:
                     index += 1
     for new_line_index in [9, 19, 29, 39, 49, 59, 69, 79, 89, 99, 109, 119]:
         list_position[new_line_index] = "\n"
-    castling_rights = fields[2]
-    position = "".join(list_position)
-    castling: list[bool] = [True if "Q" in castling_rights else False, True if "K" in castling_rights else False]
-    opponent_castling: list[bool] = [True if "q" in castling_rights else False, True if "k" in castling_rights else False]
+    castling: int = sum(rights for letter, rights in CASTLING_LETTERS.items() if letter in fields[2])
     en_passant: int = parse_coordinates(fields[3]) if fields[3] != "-" else 0
-    king_passant: int = 0
-    color = fields[1]
-    if color == "b":
-        position, castling, opponent_castling, en_passant, king_passant, _ = rotate_position(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-    return position, castling, opponent_castling, en_passant, king_passant, color
+    position: Position = Position("".join(list_position), castling, en_passant, 0, "w", 0, (0, 0, 0))
+    if fields[1] == "b":
+        position = rotate_position(position)
+    return position._replace(key=zobrist_hash(position), scores=position_scores(position.board))
 
 
-def generate_fen(position: str, castling: list[bool], opponent_castling: list[bool], en_passant: int, king_passant: int, color: str) -> str:
+def generate_fen(position: Position) -> str:
     """Returns a FEN string representing the given position."""
+    color: str = position.color
     if color == "b":
-        position, castling, opponent_castling, en_passant, king_passant, _ = rotate_position(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
+        position = rotate_position(position)
+    board, castling, en_passant = position.board, position.castling, position.en_passant
     fen: str = ""
     for rank in range(8):
         empty_squares: int = 0
         for file in range(8):
-            piece: str = position[(10 * (rank + 2)) + file + 1]
+            piece: str = board[(10 * (rank + 2)) + file + 1]
             if piece == ".":
                 empty_squares += 1
             else:
@@ -1088,12 +2363,8 @@ def generate_fen(position: str, castling: list[bool], opponent_castling: list[bo
         if rank < 7:
             fen += "/"
     fen += " w" if color == "w" else " b"
-    if castling[0] or castling[1] or opponent_castling[0] or opponent_castling[1]:
-        fen += " "
-        fen += "K" if castling[1] else ""
-        fen += "Q" if castling[0] else ""
-        fen += "k" if opponent_castling[1] else ""
-        fen += "q" if opponent_castling[0] else ""
+    if castling:
+        fen += " " + "".join(letter for letter, rights in CASTLING_LETTERS.items() if castling & rights)
     else:
         fen += " -"
     fen += " -" if en_passant == 0 or en_passant == 119 else f" {render_coordinates(en_passant)}"
@@ -1101,17 +2372,17 @@ def generate_fen(position: str, castling: list[bool], opponent_castling: list[bo
     return fen
 
 
-def display_board(position: str, castling: list[bool], opponent_castling: list[bool], en_passant: int, king_passant: int, color: str, unicode: bool = False) -> list[str]:
+def display_board(position: Position, unicode: bool = False) -> list[str]:
     """Converts the position into a list of strings in which each string represents a row in an text display of the
     board."""
-    if color == "b":
-        position, castling, opponent_castling, en_passant, king_passant, _ = rotate_position(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
+    if position.color == "b":
+        position = rotate_position(position)
     board: list[str] = []
     for rank in range(8):
         board.append("+---+---+---+---+---+---+---+---+")
         row: str = "|"
         for file in range(8):
-            piece: str = position[(10 * (rank + 2)) + file + 1]
+            piece: str = position.board[(10 * (rank + 2)) + file + 1]
             row += (f" {(UNICODE_PIECE_SYMBOLS[piece] if unicode else piece) if piece != '.' else ' '} |")
         row += (f" {str(8 - rank)}")
         board.append("".join(row))
@@ -1120,76 +2391,822 @@ def display_board(position: str, castling: list[bool], opponent_castling: list[b
     return board
 
 
+#########
+# PERFT #
+#########
+
+def perft_root(backend: str, position: Position) -> list[tuple[str, tuple]]:
+    """Returns the legal root moves in long algebraic notation along with the position after each one, in the
+    representation of the given backend."""
+    root_moves: list[tuple[str, tuple]] = []
+    if backend == "bitboard":
+        piece_bitboards, bitboard_color, castling_rights, en_passant_square = bitboard_position(position)
+        side: int = 1 if bitboard_color == "w" else 0
+        for move in generate_bitboard_moves(piece_bitboards, bitboard_color, castling_rights, en_passant_square):
+            new_position: tuple[list[int], str, int, int] = make_bitboard_move(move, piece_bitboards, bitboard_color, castling_rights, en_passant_square)
+            if not is_bitboard_square_attacked(new_position[0], new_position[0][side + 10].bit_length() - 1, side ^ 1):
+                root_moves.append((bitboard_notation(move), new_position))
+    else:
+        for move in generate_captures(position.board) + generate_quiet_moves(position.board, position.castling, position.en_passant):
+            new_position: Position = rotate_position(make_move(move, position))
+            if not king_in_check(new_position.board, new_position.king_passant):
+                root_moves.append((algebraic_notation(move, position.color), new_position))
+    return root_moves
+
+
+def perft_subtree(depth: int, backend: str, use_cache: bool, position: tuple) -> int:
+    """Counts the leaf nodes below a position after a root move, using the cache shared by every root move of the run
+    in this process."""
+    cache: dict[tuple, int] | None = PERFT_CACHE if use_cache else None
+    if backend == "bitboard":
+        return bitboard_perft(depth, *position, cache=cache)
+    return perft(depth, position, cache)
+
+
+def divide(depth: int, backend: str, use_cache: bool, jobs: int, position: Position) -> list[tuple[str, int]]:
+    """Counts the leaf nodes below each legal root move, splitting the root moves over a pool of processes if more than
+    one job is given."""
+    root_moves: list[tuple[str, tuple]] = perft_root(backend, position)
+    PERFT_CACHE.clear()
+    if jobs <= 1:
+        return [(notation, perft_subtree(depth - 1, backend, use_cache, new_position)) for notation, new_position in root_moves]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=MULTIPROCESSING_CONTEXT, initializer=initialize_engine) as executor:
+        counts: Iterator[int] = executor.map(perft_subtree, itertools.repeat(depth - 1), itertools.repeat(backend), itertools.repeat(use_cache), [new_position for _, new_position in root_moves])
+        return [(notation, count) for (notation, _), count in zip(root_moves, counts)]
+
+
+def perft_report(depth: int, backend: str, use_cache: bool, jobs: int, show_moves: bool, position: Position) -> list[str]:
+    """Runs perft (or divide if show_moves is set) on a position and returns the lines to display."""
+    depth = max(depth, 1)
+    perft_start: float = time.time()
+    move_counts: list[tuple[str, int]] = divide(depth, backend, use_cache, jobs, position)
+    elapsed: float = time.time() - perft_start
+    leaf_nodes: int = sum(count for _, count in move_counts)
+    lines: list[str] = [f"{notation}: {count}" for notation, count in move_counts] if show_moves else []
+    lines.append(f"perft {depth} nodes {leaf_nodes} time {round(elapsed * 1000)} nps {round(leaf_nodes / max(elapsed, 1e-6))} backend {backend}")
+    return lines
+
+
+def perft_suite_report(depth: int, backend: str, use_cache: bool, jobs: int) -> list[str]:
+    """Runs perft on every position of the standard suite to the given depth (or the deepest reference count) and
+    returns the lines to display, comparing each count against its reference."""
+    lines: list[str] = []
+    passed: int = 0
+    total_nodes: int = 0
+    suite_start: float = time.time()
+    for fen, reference_counts in PERFT_SUITE:
+        suite_depth: int = min(max(depth, 1), len(reference_counts))
+        position_start: float = time.time()
+        leaf_nodes: int = sum(count for _, count in divide(suite_depth, backend, use_cache, jobs, load_fen(fen)))
+        elapsed: float = time.time() - position_start
+        total_nodes += leaf_nodes
+        result: str = "pass" if leaf_nodes == reference_counts[suite_depth - 1] else "FAIL"
+        passed += result == "pass"
+        lines.append(f"{result} depth {suite_depth} nodes {leaf_nodes} expected {reference_counts[suite_depth - 1]} time {round(elapsed * 1000)} fen {fen}")
+    elapsed: float = time.time() - suite_start
+    lines.append(f"passed {passed}/{len(PERFT_SUITE)} nodes {total_nodes} time {round(elapsed * 1000)} nps {round(total_nodes / max(elapsed, 1e-6))} backend {backend}")
+    return lines
+
+
+#############
+# BENCHMARK #
+#############
+
+def bench(depth: int) -> list[str]:
+    """Searches every bench position to a fixed depth, each with a cleared transposition table and without the opening
+    book or a time limit, and returns the lines to display."""
+    global OPENING_BOOKS, COMPILED_BOOK, time_limit, soft_time_limit, node_limit
+    opening_books: list[mmap.mmap] = OPENING_BOOKS
+    compiled_book: mmap.mmap | None = COMPILED_BOOK
+    OPENING_BOOKS, COMPILED_BOOK = [], None
+    time_limit = float("inf")
+    soft_time_limit = float("inf")
+    node_limit = float("inf")
+    SEARCH_STOP.clear()
+    lines: list[str] = []
+    total_nodes: int = 0
+    beta_cutoffs: int = 0  # only counted while statistics are collected
+    first_move_cutoffs: int = 0
+    bench_start: float = time.time()
+    for number, fen in enumerate(BENCH_POSITIONS, start=1):
+        position: Position = load_fen(fen)
+        clear_transposition_table()
+        clear_move_ordering()
+        REPETITION_TABLE.clear()
+        position_start: float = time.time()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # only the summary is shown
+            best_move: tuple[int, int, str, str] = counted_search(depth, position)
+        position_nodes: int = nodes + helper_nodes()
+        total_nodes += position_nodes
+        if COLLECT_STATISTICS:
+            beta_cutoffs += STATISTICS["beta_cutoffs"]
+            first_move_cutoffs += STATISTICS["first_move_cutoffs"]
+        lines.append(f"position {number}/{len(BENCH_POSITIONS)} bestmove {algebraic_notation(best_move, position.color)} nodes {position_nodes} time {round((time.time() - position_start) * 1000)}")
+    OPENING_BOOKS, COMPILED_BOOK = opening_books, compiled_book
+    elapsed: float = time.time() - bench_start
+    if COLLECT_STATISTICS:
+        lines.append(f"first move cutoff rate {first_move_cutoffs / max(beta_cutoffs, 1):.4f} ({first_move_cutoffs}/{beta_cutoffs} beta cutoffs)")
+    if EVALUATION_PARAMETERS_FILE != "":  # the node count is only comparable between runs with the same parameters
+        lines.append(f"using the tuned evaluation parameters in {EVALUATION_PARAMETERS_FILE}")
+    lines.append(f"bench depth {depth} nodes {total_nodes} time {round(elapsed * 1000)} nps {round(total_nodes / max(elapsed, 1e-6))}")
+    return lines
+
+
+##############
+# STATISTICS #
+##############
+
+def counted_search(depth: int, position: Position, split_root: bool = False) -> tuple[int, int, str, str]:
+    """Runs iteratively_deepen() with the statistics counters reset beforehand, keeping their summary (and appending
+    it to the statistics file if there is one) afterwards when statistics are collected."""
+    if not COLLECT_STATISTICS:
+        return iteratively_deepen(depth, position, split_root)
+    STATISTICS.update(dict.fromkeys(STATISTICS_COUNTERS, 0))
+    STATISTICS_ITERATIONS.clear()
+    search_start: float = time.time()
+    best_move: tuple[int, int, str, str] = iteratively_deepen(depth, position, split_root)
+    STATISTICS["time"] = round((time.time() - search_start) * 1000)
+    STATISTICS_SUMMARY.clear()
+    STATISTICS_SUMMARY.update(statistics_summary())
+    if STATISTICS_FILE != "":
+        record: dict = {"fen": generate_fen(position), "bestmove": algebraic_notation(best_move, position.color)} | STATISTICS_SUMMARY
+        with open(STATISTICS_FILE, "a") as file:
+            file.write(json.dumps(record) + "\n")
+    return best_move
+
+
+def configure_statistics() -> None:
+    """Enables or disables statistics collection according to the "Stats" and "StatsFile" UCI options."""
+    global COLLECT_STATISTICS
+    COLLECT_STATISTICS = STATISTICS_ENABLED or STATISTICS_FILE != ""
+
+
+def statistics_summary() -> dict:
+    """Returns the statistics of the last search along with the rates derived from them and the effective branching
+    factor of every iteration."""
+    summary: dict = dict(STATISTICS)
+    summary["tt_hit_rate"] = round(STATISTICS["tt_hits"] / max(STATISTICS["tt_probes"], 1), 4)
+    summary["eval_cache_hit_rate"] = round(1 - STATISTICS["eval_cache_misses"] / max(STATISTICS["evaluations"], 1), 4)  # repetitions need no evaluation either
+    summary["first_move_cutoff_rate"] = round(STATISTICS["first_move_cutoffs"] / max(STATISTICS["beta_cutoffs"], 1), 4)
+    summary["iterations"] = []
+    previous_iteration_nodes: int = 0
+    previous_total_nodes: int = 0
+    for depth, total_nodes in STATISTICS_ITERATIONS:  # node counts are cumulative over the search
+        iteration_nodes: int = total_nodes - previous_total_nodes
+        branching_factor: float | None = round(iteration_nodes / previous_iteration_nodes, 2) if previous_iteration_nodes > 0 else None
+        summary["iterations"].append({"depth": depth, "nodes": iteration_nodes, "branching_factor": branching_factor})
+        previous_iteration_nodes, previous_total_nodes = iteration_nodes, total_nodes
+    return summary
+
+
+##################
+# BATCH ANALYSIS #
+##################
+
+def parse_epd(line: str) -> tuple[str, dict[str, str]]:
+    """Splits an EPD (or FEN) line into the position fields and its operations, e.g. {"acd": "6", "id": "\"BK.01\""}.
+    The move counters of a FEN are ignored since they are not needed to search the position."""
+    fields: list[str] = line.split(maxsplit=4)
+    operations: dict[str, str] = {}
+    if len(fields) == 5:
+        extra_fields: list[str] = fields[4].split()
+        remainder: str = fields[4]
+        if len(extra_fields) >= 2 and extra_fields[0].isdigit() and extra_fields[1].isdigit():  # FEN move counters
+            remainder = " ".join(extra_fields[2:])
+        for operation in remainder.split(";"):
+            opcode, _, operand = operation.strip().partition(" ")
+            if opcode != "":
+                operations[opcode] = operand.strip()
+    return " ".join(fields[:4]), operations
+
+
+def batch_initializer(hash_size: int, parameters_file: str) -> None:
+    """Sets up a batch analysis process. Its tables stay warm between positions, the opening books aren't loaded since
+    searched scores are wanted and search output is discarded since results are returned instead."""
+    initialize_evaluation(parameters_file)
+    resize_transposition_table(hash_size)
+    resize_evaluation_cache(EVALUATION_CACHE_SIZE)
+    reset_search_state()
+    sys.stdout = open(os.devnull, "w")
+
+
+def analyze_position(line_number: int, fen: str, operations: dict[str, str], depth: int, movetime: int | None, node_count: int | None) -> dict:
+    """Searches a single position in a batch analysis process, the "acd" (depth), "acn" (nodes) and "acs" (seconds)
+    EPD operations override the limits given on the command line."""
+    global time_limit, soft_time_limit, node_limit
+    if operations.get("acd", "").isdigit():
+        depth = int(operations["acd"])
+    if operations.get("acn", "").isdigit():
+        node_count = int(operations["acn"])
+    if operations.get("acs", "").isdigit():
+        movetime = int(operations["acs"]) * 1000
+    position: Position = load_fen(fen)
+    color: str = position.color
+    REPETITION_TABLE.clear()
+    time_limit = movetime / 1000 if movetime is not None else float("inf")
+    soft_time_limit = time_limit
+    node_limit = node_count if node_count is not None else float("inf")
+    analysis_start: float = time.time()
+    best_move: tuple[int, int, str, str] = iteratively_deepen(depth, position)
+    depth_reached, score, pv = completed_iteration
+    return {
+        "line": line_number,
+        "fen": fen,
+        "id": operations.get("id", "").strip('"') or None,
+        "bestmove": algebraic_notation(best_move, color),
+        "score": score * (-1 if color == "b" else 1),  # from white's point of view like the UCI output
+        "depth": depth_reached,
+        "pv": " ".join(algebraic_notation(move, color if ply % 2 == 0 else ("b" if color == "w" else "w")) for ply, move in enumerate(pv)),
+        "nodes": nodes,
+        "time": round((time.time() - analysis_start) * 1000),
+    }
+
+
+def analyze_positions(input_file, output_file, jobs: int, depth: int, movetime: int | None, node_count: int | None, hash_size: int) -> int:
+    """Analyzes every position of an EPD or FEN file (one per line) with a pool of processes, writing one JSON object
+    per position to the output as soon as its search finishes. Returns the number of positions analyzed."""
+    pending: dict[concurrent.futures.Future, tuple[int, str]] = {}  # format is {future: (line_number, fen)}
+    analyzed: int = 0
+
+    def write_results(finished: set[concurrent.futures.Future]) -> None:
+        nonlocal analyzed
+        for future in finished:
+            line_number, fen = pending.pop(future)
+            try:
+                result: dict = future.result()
+            except Exception as error:  # invalid position
+                result = {"line": line_number, "fen": fen, "error": repr(error)}
+            output_file.write(json.dumps(result) + "\n")
+            output_file.flush()
+            analyzed += 1
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=MULTIPROCESSING_CONTEXT, initializer=batch_initializer, initargs=(hash_size, EVALUATION_PARAMETERS_FILE)) as executor:
+        for line_number, line in enumerate(input_file, start=1):
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            fen, operations = parse_epd(line)
+            pending[executor.submit(analyze_position, line_number, fen, operations, depth, movetime, node_count)] = (line_number, fen)
+            if len(pending) >= 2 * jobs:  # only read ahead a little so that large files are streamed
+                finished, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                write_results(finished)
+        for future in concurrent.futures.as_completed(list(pending)):  # write the last positions one by one as they finish
+            write_results({future})
+    return analyzed
+
+
+####################
+# BATCH EVALUATION #
+####################
+
+def encode_positions(fens: list[str]) -> tuple["numpy.ndarray", "numpy.ndarray"]:
+    """Encodes FEN strings (starting with the piece placement, without line breaks) as an int8 array of piece codes
+    (see BATCH_PIECES) with one row of 64 squares (a8 to h1) per position, seen from the side-to-move like the board of
+    load_fen(), along with whether black is to move. All FENs are decoded at once from their joined bytes: characters
+    are translated to piece codes and run lengths (the digits of empty squares) that numpy.repeat() expands."""
+    if not fens:
+        return numpy.zeros((0, 64), dtype=numpy.int8), numpy.zeros(0, dtype=bool)
+    joined_fens: bytes = ("\n".join(fens) + "\n").encode()
+    data: numpy.ndarray = numpy.frombuffer(joined_fens, dtype=numpy.uint8)
+    line_ends: numpy.ndarray = numpy.flatnonzero(data == ord("\n"))
+    line_starts: numpy.ndarray = numpy.concatenate(([0], line_ends[:-1] + 1))
+    spaces: numpy.ndarray = numpy.append(numpy.flatnonzero(data == ord(" ")), len(data))
+    board_ends: numpy.ndarray = spaces[numpy.searchsorted(spaces, line_starts)]
+    if numpy.any(board_ends >= line_ends):
+        raise ValueError("FEN without side-to-move")
+    black: numpy.ndarray = data[board_ends + 1] == ord("b")
+    field_lengths: numpy.ndarray = numpy.empty(2 * len(fens), dtype=numpy.intp)  # alternating piece placement and other fields
+    field_lengths[0::2] = board_ends - line_starts
+    field_lengths[1::2] = line_ends + 1 - board_ends
+    in_board: numpy.ndarray = numpy.repeat(numpy.tile(numpy.array([True, False]), len(fens)), field_lengths)
+    run_lengths: numpy.ndarray = numpy.frombuffer(joined_fens.translate(BATCH_RUN_LENGTHS), dtype=numpy.uint8) * in_board
+    codes: numpy.ndarray = numpy.repeat(numpy.frombuffer(joined_fens.translate(BATCH_CODES), dtype=numpy.int8), run_lengths).reshape(-1, 64)
+    swapped_codes: numpy.ndarray = numpy.array([0, 7, 8, 9, 10, 11, 12, 1, 2, 3, 4, 5, 6], dtype=numpy.int8)  # swaps the case of a piece
+    codes[black] = swapped_codes[codes[black, ::-1]]  # rotate_position() turns the board 180 degrees
+    return codes, black
+
+
+def piece_planes(codes: "numpy.ndarray") -> "numpy.ndarray":
+    """Expands the piece codes from encode_positions() into twelve int8 planes per position (one for each piece type
+    and side, in the order of BATCH_PIECES) marking the squares the pieces are on."""
+    return (codes[:, None, :] == numpy.arange(1, len(BATCH_PIECES), dtype=numpy.int8)[None, :, None]).astype(numpy.int8)
+
+
+def batch_king_distances(codes: "numpy.ndarray") -> tuple["numpy.ndarray", "numpy.ndarray"]:
+    """Calculates the Manhattan distance of every square to the king relevant for king tropism (the opponent's king for
+    the side-to-move's pieces and vice versa) and the distance between both kings for positions encoded by
+    encode_positions(). A missing king counts as being on square 0 of the 10x12 board like in full_evaluation()."""
+    rows: numpy.ndarray = numpy.arange(64, dtype=numpy.int8) // 8 + A8 // 10  # coordinates of the squares on the 10x12 board
+    files: numpy.ndarray = numpy.arange(64, dtype=numpy.int8) % 8 + A8 % 10
+    king_coordinates: list[tuple[numpy.ndarray, numpy.ndarray]] = []
+    for king_code in (BATCH_PIECES.index("K"), BATCH_PIECES.index("k")):
+        on_square: numpy.ndarray = codes == king_code
+        king_square: numpy.ndarray = on_square.argmax(axis=1)
+        found: numpy.ndarray = on_square.any(axis=1)
+        king_coordinates.append((numpy.where(found, rows[king_square], 0).astype(numpy.int8)[:, None], numpy.where(found, files[king_square], 0).astype(numpy.int8)[:, None]))
+    (king_row, king_file), (opponent_king_row, opponent_king_file) = king_coordinates
+    distances: numpy.ndarray = numpy.where(codes <= 6, numpy.abs(rows - opponent_king_row) + numpy.abs(files - opponent_king_file), numpy.abs(rows - king_row) + numpy.abs(files - king_file))
+    return distances, (numpy.abs(king_row - opponent_king_row) + numpy.abs(king_file - opponent_king_file))[:, 0].astype(numpy.int64)
+
+
+def batch_phases(codes: "numpy.ndarray") -> "numpy.ndarray":
+    """Calculates the game phase of positions encoded by encode_positions(), scaled like game_phase()."""
+    phases: numpy.ndarray = numpy.array([0] + [PIECE_PHASES[piece] for piece in BATCH_PIECES[1:]], dtype=numpy.int64)
+    return ((TOTAL_PHASE - phases[codes].sum(axis=1)) * 256 + TOTAL_PHASE // 2) // TOTAL_PHASE  # scale_phase()
+
+
+def batch_evaluation_table() -> "numpy.ndarray":
+    """Packs the midgame and endgame scores (material, piece square tables and king tropism) and the game phase of
+    every piece into a flat table indexed by (piece code * 64 + square) * 65 + square of the king relevant for king
+    tropism (64 if it is missing, which counts as square 0 of the 10x12 board like in full_evaluation()), so that one
+    lookup per square gives everything it adds to the evaluation (nothing for empty squares). Each value takes BATCH_FIELD_BITS bits."""
+    squares: list[int] = [A8 + 10 * (square // 8) + square % 8 for square in range(64)]
+    distances: numpy.ndarray = numpy.array([[MANHATTAN_DISTANCES[king_square][square] for king_square in squares + [0]] for square in squares])
+    scores: numpy.ndarray = numpy.zeros((len(BATCH_PIECES), 64, 65), dtype=numpy.int64)
+    for code, piece in enumerate(BATCH_PIECES[1:], start=1):
+        scores[code] = numpy.array([PIECE_SQUARE_SCORES[piece][square] for square in squares])[:, None] + numpy.array(TROPISM_SCORES[piece])[distances]
+    midgame_scores: numpy.ndarray = ((scores + (1 << 31)) & 0xFFFFFFFF) - (1 << 31)  # unpack_score()
+    phases: numpy.ndarray = numpy.array([0] + [PIECE_PHASES[piece] for piece in BATCH_PIECES[1:]], dtype=numpy.int64)[:, None, None]
+    return (midgame_scores + (((scores - midgame_scores) >> 32) << BATCH_FIELD_BITS) + (phases << (2 * BATCH_FIELD_BITS))).reshape(-1)
+
+
+def unpack_batch_field(values: "numpy.ndarray") -> tuple["numpy.ndarray", "numpy.ndarray"]:
+    """Splits the lowest signed field of values packed like by batch_evaluation_table() (or sums of them) off the
+    rest, like unpack_score()."""
+    field: numpy.ndarray = ((values + (1 << (BATCH_FIELD_BITS - 1))) & ((1 << BATCH_FIELD_BITS) - 1)) - (1 << (BATCH_FIELD_BITS - 1))
+    return field, (values - field) >> BATCH_FIELD_BITS
+
+
+def encoded_scores(codes: "numpy.ndarray", table: "numpy.ndarray") -> "numpy.ndarray":
+    """Evaluates positions encoded by encode_positions() using the table of batch_evaluation_table(), looking up every
+    square (empty squares add nothing) and summing the packed values of each position."""
+    king_squares: list[numpy.ndarray] = []  # the side-to-move's king, then the opponent's
+    for king_code in (BATCH_PIECES.index("K"), BATCH_PIECES.index("k")):
+        on_square: numpy.ndarray = codes == king_code
+        first_square: numpy.ndarray = on_square.argmax(axis=1)  # the first king like str.find()
+        king_squares.append(numpy.where(on_square[numpy.arange(len(codes)), first_square], first_square, 64))
+    king_square, opponent_king_square = king_squares
+    indexes: numpy.ndarray = codes.astype(numpy.intp)
+    indexes *= 64 * 65
+    indexes += numpy.arange(64) * 65 + king_square[:, None]
+    indexes += (codes <= 6) * (opponent_king_square - king_square)[:, None]  # the side-to-move's pieces use the opponent's king
+    midgame_scores, totals = unpack_batch_field(table[indexes].sum(axis=1))
+    endgame_scores, phases = unpack_batch_field(totals)
+    rows: numpy.ndarray = numpy.append(numpy.arange(64) // 8 + A8 // 10, 0)  # coordinates of the squares on the 10x12 board
+    files: numpy.ndarray = numpy.append(numpy.arange(64) % 8 + A8 % 10, 0)
+    king_distances: numpy.ndarray = numpy.abs(rows[king_square] - rows[opponent_king_square]) + numpy.abs(files[king_square] - files[opponent_king_square])
+    endgame_scores += numpy.sign(endgame_scores) * (MOP_UP_SCORE * (14 - king_distances) // 14)
+    phases = ((TOTAL_PHASE - phases) * 256 + TOTAL_PHASE // 2) // TOTAL_PHASE  # scale_phase()
+    return (midgame_scores * (256 - phases) + endgame_scores * phases) // 256
+
+
+def evaluate_encoded(codes: "numpy.ndarray") -> "numpy.ndarray":
+    """Statically evaluates many positions already encoded as int8 piece codes like by encode_positions() (one row of
+    64 squares per position, seen from the side-to-move) with NumPy, returning the same centipawn scores as
+    evaluate_batch() as an int64 array. Requires NumPy and initialize_engine()."""
+    if numpy is None:
+        raise ImportError("evaluate_encoded() requires NumPy")
+    table: numpy.ndarray = batch_evaluation_table()
+    results: list[numpy.ndarray] = [encoded_scores(codes[chunk_start:chunk_start + BATCH_CHUNK_SIZE], table) for chunk_start in range(0, len(codes), BATCH_CHUNK_SIZE)]
+    return numpy.concatenate(results) if results else numpy.zeros(0, dtype=numpy.int64)
+
+
+def evaluate_batch(fens: list[str]) -> "numpy.ndarray":
+    """Statically evaluates many positions given as FEN strings with NumPy, returning the same centipawn scores as
+    load_fen() followed by evaluate_position() (for the side-to-move, without the repetition check) as an int64 array.
+    Requires NumPy and initialize_engine()."""
+    if numpy is None:
+        raise ImportError("evaluate_batch() requires NumPy")
+    table: numpy.ndarray = batch_evaluation_table()
+    results: list[numpy.ndarray] = [encoded_scores(encode_positions(fens[chunk_start:chunk_start + BATCH_CHUNK_SIZE])[0], table) for chunk_start in range(0, len(fens), BATCH_CHUNK_SIZE)]
+    return numpy.concatenate(results) if results else numpy.zeros(0, dtype=numpy.int64)
+
+
+#####################
+# EVALUATION TUNING #
+#####################
+
+def load_evaluation_parameters(path: pathlib.Path) -> None:
+    """Replaces the piece values, piece square tables and tropism values with the ones of a JSON file written by
+    write_evaluation_parameters(), keeping the current value of any entry missing from the file. Raises ValueError if
+    the file has an unknown parameter, piece or a piece square table without 64 squares, in which case nothing is
+    replaced."""
+    parameters: dict = json.loads(path.read_text())
+    for name, values in parameters.items():
+        if name == "description":
+            continue
+        if name not in EVALUATION_PARAMETER_NAMES or not isinstance(values, dict) or not set(values) <= set("PNBRQK"):
+            raise ValueError(f"invalid evaluation parameter {name} in {path}")
+        for value in values.values():
+            if not (isinstance(value, int) or (name.endswith("TABLES") and isinstance(value, list) and len(value) == 64 and all(isinstance(entry, int) for entry in value))):
+                raise ValueError(f"invalid evaluation parameter {name} in {path}")
+    for name in EVALUATION_PARAMETER_NAMES:
+        globals()[name].update(parameters.get(name, {}))  # updated in place since other tables refer to the same dicts
+
+
+def unpadded_table(table: list[int]) -> list[int]:
+    """Returns the 64 squares of a piece square table whether or not initialize_evaluation() has padded it to 10x12."""
+    return table if len(table) == 64 else [table[A8 + 10 * (square // 8) + square % 8] for square in range(64)]
+
+
+def tuning_features(fens: list[str], results: "numpy.ndarray") -> tuple["numpy.ndarray", ...]:
+    """Extracts the features the evaluation is linear in from positions given as FEN strings and their results from
+    white's point of view. Pieces are stored as one uint16 entry each ((piece type * 64 + piece square table square) * 2
+    + 1 for opponent pieces) along with the number of pieces of every position, and the tropism terms as the sum of
+    1 / distance over the pieces of each type (negated for opponent pieces). Everything is seen from the side-to-move
+    like in evaluate_position(), so results are flipped for black."""
+    codes, black = encode_positions(fens)
+    position_indexes, squares = numpy.nonzero(codes)
+    piece_codes: numpy.ndarray = codes[position_indexes, squares]
+    opponent: numpy.ndarray = piece_codes > 6
+    piece_types: numpy.ndarray = (piece_codes - 1) % 6
+    entries: numpy.ndarray = (((piece_types.astype(numpy.uint16) * 64 + (squares ^ (56 * opponent))) << 1) | opponent).astype(numpy.uint16)  # opponent pieces use vertically mirrored tables
+    distances, king_distances = batch_king_distances(codes)
+    piece_distances: numpy.ndarray = distances[position_indexes, squares]
+    tropism_weights: numpy.ndarray = numpy.where(opponent, -1.0, 1.0) / numpy.maximum(piece_distances, 1) * (piece_distances > 0)  # distance 0 only happens if a king is missing
+    tropism: numpy.ndarray = numpy.bincount(position_indexes * 6 + piece_types, weights=tropism_weights, minlength=len(fens) * 6).reshape(-1, 6)[:, :len(TUNING_PIECES)]
+    piece_counts: numpy.ndarray = numpy.bincount(position_indexes, minlength=len(fens))
+    return entries, piece_counts.astype(numpy.uint8), batch_phases(codes).astype(numpy.int16), king_distances.astype(numpy.uint8), tropism.astype(numpy.float32), numpy.where(black, 1 - results, results).astype(numpy.float32)
+
+
+def extract_tuning_features(corpus_path: pathlib.Path, cache_path: pathlib.Path) -> int:
+    """Streams a corpus of positions with one FEN or EPD per line followed by the game result (like 1-0, 1/2-1/2,
+    "0-1"; or [0.5]) and saves the features of every position to a compressed feature cache. Lines without a result are
+    skipped. Returns the number of positions extracted."""
+    chunks: list[tuple[numpy.ndarray, ...]] = []
+    fens: list[str] = []
+    results: list[float] = []
+    with open(corpus_path) as corpus:
+        for line in corpus:
+            match: re.Match | None = TUNING_RESULT_PATTERN.search(line)
+            if match is None:
+                continue
+            fens.append(line.strip())
+            results.append(TUNING_RESULTS[match.group(1)] if match.group(1) in TUNING_RESULTS else float(match.group(1)))
+            if len(fens) == BATCH_CHUNK_SIZE:
+                chunks.append(tuning_features(fens, numpy.array(results)))
+                fens, results = [], []
+    if fens or not chunks:
+        chunks.append(tuning_features(fens, numpy.array(results)))
+    corpus_stat: os.stat_result = corpus_path.stat()
+    with open(cache_path, "wb") as cache:  # numpy.savez_compressed() would add ".npz" to other file names
+        numpy.savez_compressed(cache, entries=numpy.concatenate([chunk[0] for chunk in chunks]), piece_counts=numpy.concatenate([chunk[1] for chunk in chunks]), phases=numpy.concatenate([chunk[2] for chunk in chunks]), king_distances=numpy.concatenate([chunk[3] for chunk in chunks]), tropism=numpy.concatenate([chunk[4] for chunk in chunks]), results=numpy.concatenate([chunk[5] for chunk in chunks]), corpus_stamp=numpy.array([corpus_stat.st_size, corpus_stat.st_mtime_ns]))
+    return sum(len(chunk[1]) for chunk in chunks)
+
+
+def feature_cache_valid(corpus_path: pathlib.Path, cache_path: pathlib.Path) -> bool:
+    """Checks whether a feature cache can be reused, which is the case while the corpus it was extracted from is
+    unchanged (or no longer there)."""
+    if not cache_path.is_file():
+        return False
+    if not corpus_path.is_file():
+        return True
+    with numpy.load(cache_path) as cache:
+        corpus_stamp: list[int] = cache["corpus_stamp"].tolist()
+    return corpus_stamp == [corpus_path.stat().st_size, corpus_path.stat().st_mtime_ns]
+
+
+def load_tuning_model(cache_path: pathlib.Path) -> tuple["numpy.ndarray", ...]:
+    """Loads a feature cache into the arrays used to evaluate the tuned parameters: the position and parameter index of
+    every piece (opponent pieces index the negated copy of the piece square tables, see tuning_evaluation()), the
+    dense features (material balance and tropism terms for each tuned piece), the phase as a fraction, the mop-up bonus
+    and the results."""
+    with numpy.load(cache_path) as cache:
+        entries: numpy.ndarray = cache["entries"]
+        piece_counts: numpy.ndarray = cache["piece_counts"]
+        phases: numpy.ndarray = cache["phases"] / 256
+        mop_up_bonuses: numpy.ndarray = (MOP_UP_SCORE * (14 - cache["king_distances"].astype(numpy.int64)) // 14).astype(numpy.float64)
+        tropism: numpy.ndarray = cache["tropism"].astype(numpy.float64)
+        results: numpy.ndarray = cache["results"].astype(numpy.float64)
+    position_count: int = len(piece_counts)
+    rows: numpy.ndarray = numpy.repeat(numpy.arange(position_count, dtype=numpy.int32), piece_counts)
+    columns: numpy.ndarray = ((entries >> 1) + 384 * (entries & 1)).astype(numpy.int32)
+    signs: numpy.ndarray = 1 - 2 * (entries & 1).astype(numpy.float64)
+    material: numpy.ndarray = numpy.bincount(rows.astype(numpy.int64) * 6 + (entries >> 7), weights=signs, minlength=position_count * 6).reshape(-1, 6)[:, :len(TUNING_PIECES)]
+    return rows, columns, numpy.hstack([material, tropism]), phases, mop_up_bonuses, results
+
+
+def initial_tuning_parameters() -> "numpy.ndarray":
+    """Collects the current evaluation parameters into the vector that is tuned: the midgame and endgame piece square
+    tables (6 * 64 each), then the midgame piece values and tropism values of the tuned pieces, and the same for the
+    endgame."""
+    return numpy.array(
+        [value for piece in "PNBRQK" for value in unpadded_table(MIDGAME_PIECE_SQUARE_TABLES[piece])]
+        + [value for piece in "PNBRQK" for value in unpadded_table(ENDGAME_PIECE_SQUARE_TABLES[piece])]
+        + [MIDGAME_PIECE_VALUES[piece] for piece in TUNING_PIECES] + [MIDGAME_TROPISM_VALUES[piece] for piece in TUNING_PIECES]
+        + [ENDGAME_PIECE_VALUES[piece] for piece in TUNING_PIECES] + [ENDGAME_TROPISM_VALUES[piece] for piece in TUNING_PIECES],
+        dtype=numpy.float64,
+    )
+
+
+def tuning_evaluation(parameters: "numpy.ndarray", model: tuple["numpy.ndarray", ...]) -> tuple["numpy.ndarray", "numpy.ndarray", "numpy.ndarray"]:
+    """Evaluates every position of a tuning model with the given parameters like full_evaluation() does, but without
+    rounding. Returns the evaluations along with the midgame and endgame scores."""
+    rows, columns, dense_features, phases, mop_up_bonuses, _ = model
+    dense_count: int = dense_features.shape[1]
+    midgame_table: numpy.ndarray = numpy.concatenate([parameters[:384], -parameters[:384]])  # opponent pieces count negatively
+    endgame_table: numpy.ndarray = numpy.concatenate([parameters[384:768], -parameters[384:768]])
+    midgame_scores: numpy.ndarray = numpy.bincount(rows, weights=midgame_table[columns], minlength=len(phases)) + dense_features @ parameters[768:768 + dense_count]
+    endgame_scores: numpy.ndarray = numpy.bincount(rows, weights=endgame_table[columns], minlength=len(phases)) + dense_features @ parameters[768 + dense_count:]
+    return midgame_scores * (1 - phases) + (endgame_scores + numpy.sign(endgame_scores) * mop_up_bonuses) * phases, midgame_scores, endgame_scores
+
+
+def tuning_loss(parameters: "numpy.ndarray", model: tuple["numpy.ndarray", ...], scaling: float, gradient: bool = False) -> tuple[float, "numpy.ndarray | None"]:
+    """Calculates the mean squared error between the results and the evaluations mapped to expected scores by a
+    sigmoid, 1 / (1 + 10 ^ (-scaling * evaluation / 400)), along with its gradient if asked for. The mop-up bonus is
+    treated as a constant."""
+    rows, columns, dense_features, phases, _, results = model
+    evaluations, _, _ = tuning_evaluation(parameters, model)
+    expected_scores: numpy.ndarray = 1 / (1 + numpy.power(10, numpy.clip(-scaling * evaluations / 400, -300, 300)))  # clipped to avoid overflows
+    errors: numpy.ndarray = expected_scores - results
+    loss: float = float(numpy.mean(errors ** 2))
+    if not gradient:
+        return loss, None
+    evaluation_gradients: numpy.ndarray = 2 * errors * expected_scores * (1 - expected_scores) * (scaling * numpy.log(10) / 400) / len(results)
+    midgame_gradients: numpy.ndarray = evaluation_gradients * (1 - phases)
+    endgame_gradients: numpy.ndarray = evaluation_gradients * phases
+    midgame_table_gradients: numpy.ndarray = numpy.bincount(columns, weights=midgame_gradients[rows], minlength=768)
+    endgame_table_gradients: numpy.ndarray = numpy.bincount(columns, weights=endgame_gradients[rows], minlength=768)
+    return loss, numpy.concatenate([
+        midgame_table_gradients[:384] - midgame_table_gradients[384:], endgame_table_gradients[:384] - endgame_table_gradients[384:],
+        dense_features.T @ midgame_gradients, dense_features.T @ endgame_gradients,
+    ])
+
+
+def fit_scaling(parameters: "numpy.ndarray", model: tuple["numpy.ndarray", ...]) -> float:
+    """Finds the sigmoid scaling constant that best maps the current evaluations to the results with a golden section
+    search, so that tuning changes the parameters rather than the scale of the evaluation."""
+    low, high = 0.01, 10.0
+    ratio: float = (5 ** 0.5 - 1) / 2
+    for _ in range(40):
+        first, second = high - ratio * (high - low), low + ratio * (high - low)
+        if tuning_loss(parameters, model, first)[0] < tuning_loss(parameters, model, second)[0]:
+            high = second
+        else:
+            low = first
+    return (low + high) / 2
+
+
+def tune_parameters(parameters: "numpy.ndarray", model: tuple["numpy.ndarray", ...], scaling: float, epochs: int, learning_rate: float, report: Callable[[int, float], None]) -> "numpy.ndarray":
+    """Minimizes tuning_loss() with full-batch gradient descent using the Adam update rule, reporting the loss every
+    hundred epochs. Returns the tuned parameters."""
+    parameters = parameters.copy()
+    first_moment: numpy.ndarray = numpy.zeros_like(parameters)
+    second_moment: numpy.ndarray = numpy.zeros_like(parameters)
+    for epoch in range(1, epochs + 1):
+        loss, gradient = tuning_loss(parameters, model, scaling, gradient=True)
+        if epoch % 100 == 0 or epoch == 1:
+            report(epoch, loss)
+        first_moment = 0.9 * first_moment + 0.1 * gradient
+        second_moment = 0.999 * second_moment + 0.001 * gradient ** 2
+        parameters -= learning_rate * (first_moment / (1 - 0.9 ** epoch)) / (numpy.sqrt(second_moment / (1 - 0.999 ** epoch)) + 1e-12)
+    return parameters
+
+
+def write_evaluation_parameters(parameters: "numpy.ndarray", path: pathlib.Path, description: str) -> None:
+    """Writes tuned parameters (rounded to whole centipawns) as a JSON file that load_evaluation_parameters() can read,
+    with one line per piece square table row. The king's values are kept since they aren't tuned."""
+    values: list[int] = [round(value) for value in parameters.tolist()]
+    piece_count: int = len(TUNING_PIECES)
+    lines: list[str] = ["{", f'  "description": {json.dumps(f"tuned by python3 simPLY_chess.py tune on {description}")},']
+    for phase_name, tables, dense_values in (("MIDGAME", values[:384], values[768:768 + 2 * piece_count]), ("ENDGAME", values[384:768], values[768 + 2 * piece_count:])):
+        piece_values: dict[str, int] = dict(zip(TUNING_PIECES, dense_values[:piece_count])) | {"K": globals()[f"{phase_name}_PIECE_VALUES"]["K"]}
+        tropism_values: dict[str, int] = dict(zip(TUNING_PIECES, dense_values[piece_count:])) | {"K": globals()[f"{phase_name}_TROPISM_VALUES"]["K"]}
+        for name, piece_dict in (("PIECE_VALUES", piece_values), ("TROPISM_VALUES", tropism_values)):
+            lines.append(f'  "{phase_name}_{name}": {json.dumps(piece_dict)},')
+        lines.append(f'  "{phase_name}_PIECE_SQUARE_TABLES": {{')
+        for piece_index, piece in enumerate("PNBRQK"):
+            rows: list[str] = [" ".join(f"{value:>4}," for value in tables[piece_index * 64 + row:piece_index * 64 + row + 8]) for row in range(0, 64, 8)]
+            lines.append(f'    "{piece}": [\n      ' + "\n      ".join(rows)[:-1] + "\n    ]" + ("," if piece != "K" else ""))
+        lines.append("  }" + ("," if phase_name == "MIDGAME" else ""))
+    lines.append("}")
+    path.write_text("\n".join(lines) + "\n")
+
+
 ################
 # UCI PROTOCOL #
 ################
 
 def send_response(response: str) -> None:
     """Sends the given response to the stdout, flushing the buffer."""
-    sys.stdout.write(response + "\n")
-    sys.stdout.flush()
+    with OUTPUT_LOCK:
+        sys.stdout.write(response + "\n")
+        sys.stdout.flush()
+
+
+def initialize_engine() -> None:
+    """Sets up the tables, opening books and global variables used by the engine."""
+    initialize_evaluation(EVALUATION_PARAMETERS_FILE)
+    load_opening_books()
+    resize_transposition_table(HASH_SIZE)
+    resize_evaluation_cache(EVALUATION_CACHE_SIZE)
+    reset_search_state()
+
+
+def initialize_evaluation(parameters_file: str = "") -> None:
+    """Sets up the packed piece square and tropism scores the evaluation uses, from the built-in parameters or the
+    tuned ones in parameters_file (see the "tune" command line tool) if it isn't empty. This is all the helper and root
+    splitting processes need besides their tables, so they skip the rest of initialize_engine()."""
+    global PIECE_SQUARE_SCORES, ROTATED_PIECE_SQUARE_SCORES, TROPISM_SCORES
+    for name, values in BUILT_IN_EVALUATION_PARAMETERS.items():
+        globals()[name].update(copy.deepcopy(values))
+    if parameters_file != "":
+        load_evaluation_parameters(pathlib.Path(parameters_file))
+    # Pad the midgame and endgame tables with zeros to make them 10x12
+    for piece in "PNBRQK":
+        blank_row: list[int] = [0] * 10
+        new_midgame_table: list[int] = blank_row + blank_row
+        new_endgame_table: list[int] = blank_row + blank_row
+        for row in range(0, 64, 8):
+            new_midgame_table += [0] + unpadded_table(MIDGAME_PIECE_SQUARE_TABLES[piece])[row:row + 8] + [0]
+            new_endgame_table += [0] + unpadded_table(ENDGAME_PIECE_SQUARE_TABLES[piece])[row:row + 8] + [0]
+        MIDGAME_PIECE_SQUARE_TABLES[piece] = new_midgame_table + blank_row + blank_row
+        ENDGAME_PIECE_SQUARE_TABLES[piece] = new_endgame_table + blank_row + blank_row
+    # Combine piece values and piece square tables into packed scores for each piece on each square, with opponent pieces
+    # (lowercase) negative. Opponent pieces use vertically mirrored tables while rotate_position() turns the board 180
+    # degrees, so the scores as seen by the opponent after rotating are kept in separate tables.
+    PIECE_SQUARE_SCORES = {}
+    ROTATED_PIECE_SQUARE_SCORES = {}
+    TROPISM_SCORES = {}
+    for piece in "PNBRQK":
+        ally_scores: list[int] = []
+        opponent_scores: list[int] = []
+        rotated_ally_scores: list[int] = []
+        rotated_opponent_scores: list[int] = []
+        for square in range(120):
+            mirrored_square: int = (11 - (square // 10)) * 10 + (square % 10)
+            rotated_mirrored_square: int = (square // 10) * 10 + (9 - (square % 10))  # mirrored square of the rotated square
+            ally_scores.append(pack_score(MIDGAME_PIECE_VALUES[piece] + MIDGAME_PIECE_SQUARE_TABLES[piece][square], ENDGAME_PIECE_VALUES[piece] + ENDGAME_PIECE_SQUARE_TABLES[piece][square]))
+            opponent_scores.append(-pack_score(MIDGAME_PIECE_VALUES[piece] + MIDGAME_PIECE_SQUARE_TABLES[piece][mirrored_square], ENDGAME_PIECE_VALUES[piece] + ENDGAME_PIECE_SQUARE_TABLES[piece][mirrored_square]))
+            rotated_ally_scores.append(-pack_score(MIDGAME_PIECE_VALUES[piece] + MIDGAME_PIECE_SQUARE_TABLES[piece][rotated_mirrored_square], ENDGAME_PIECE_VALUES[piece] + ENDGAME_PIECE_SQUARE_TABLES[piece][rotated_mirrored_square]))
+            rotated_opponent_scores.append(pack_score(MIDGAME_PIECE_VALUES[piece] + MIDGAME_PIECE_SQUARE_TABLES[piece][119 - square], ENDGAME_PIECE_VALUES[piece] + ENDGAME_PIECE_SQUARE_TABLES[piece][119 - square]))
+        PIECE_SQUARE_SCORES[piece], PIECE_SQUARE_SCORES[piece.lower()] = ally_scores, opponent_scores
+        ROTATED_PIECE_SQUARE_SCORES[piece], ROTATED_PIECE_SQUARE_SCORES[piece.lower()] = rotated_ally_scores, rotated_opponent_scores
+        # King tropism by distance to the enemy king (distance 0 only happens if a king is missing)
+        TROPISM_SCORES[piece] = [0] + [pack_score(MIDGAME_TROPISM_VALUES[piece] // distance, ENDGAME_TROPISM_VALUES[piece] // distance) for distance in range(1, 20)]
+        TROPISM_SCORES[piece.lower()] = [-score for score in TROPISM_SCORES[piece]]
+
+
+def load_opening_books() -> None:
+    """Loads the opening book data, preferring a compiled book (see compile_book()) since it only needs one probe."""
+    global OPENING_BOOKS, COMPILED_BOOK
+    if COMPILED_BOOK_PATH.is_file():
+        OPENING_BOOKS = []
+        COMPILED_BOOK = load_book(COMPILED_BOOK_PATH)
+    else:
+        OPENING_BOOKS = [load_book(book_path(book_name)) for book_name in BOOK_NAMES]  # possible to load each book individually
+        COMPILED_BOOK = None
+    # OPENING_BOOKS = []
+
+
+def reset_search_state() -> None:
+    """Initializes the global variables of the search."""
+    global max_depth, nodes, start_time, time_limit, soft_time_limit, node_limit, next_clock_check, timeout, completed_iteration
+    max_depth = 0
+    nodes = 0
+    start_time = 0
+    time_limit = 0
+    soft_time_limit = 0
+    node_limit = float("inf")
+    next_clock_check = 0
+    timeout = False
+    completed_iteration = (0, 0, [])  # format is (depth, score, principal_variation) of the last completed iteration
+
+
+def search_worker(depth: int, split_root: bool, position: Position) -> None:
+    """Runs a search on a worker thread and sends the best move, along with the expected reply to ponder on, when it is
+    done. With "go infinite" and "go ponder" the best move is only sent once the search is stopped (or the ponder move
+    is played), even if it finished before then."""
+    color: str = position.color
+    best_move: tuple[int, int, str, str] = counted_search(depth, position, split_root)
+    reply: tuple[int, int, str, str] = ponder_move(best_move, position)
+    SEARCH_RELEASE.wait()
+    if reply != (0, 0, "", ""):
+        send_response(f"bestmove {algebraic_notation(best_move, color)} ponder {algebraic_notation(reply, 'b' if color == 'w' else 'w')}")
+    else:
+        send_response(f"bestmove {algebraic_notation(best_move, color)}")
 
 
 def main() -> None:
     """The main UCI loop responsible for parsing commands and sending responses."""
-    global max_depth, nodes, start_time, time_limit, timeout, OPENING_BOOKS
-    position: str = ""
-    castling: list[bool] = []
-    opponent_castling: list[bool] = []
-    en_passant: int = 120
-    king_passant: int = 120
-    color: str = ""
+    global max_depth, nodes, start_time, time_limit, soft_time_limit, node_limit, timeout, BOARD_BACKEND, HASH_SIZE, EVALUATION_CACHE_SIZE, THREAD_COUNT, ROOT_SPLIT, STATISTICS_ENABLED, STATISTICS_FILE, MOVE_OVERHEAD, EVALUATION_PARAMETERS_FILE
+    position: Position = Position("", 0, 120, 120, "", 0, (0, 0, 0))
 
     initialized: bool = False
+    search_thread: threading.Thread | None = None
+    ponder_time_limits: tuple[float, float] = (0, 0)  # soft and hard time limits to switch to when the ponder move is played
 
     while True:
-        command: str = sys.stdin.readline().strip()
+        command: str = sys.stdin.readline()
+        if command == "":  # end of input, the GUI has gone away
+            command = "quit"
         tokens: list[str] = command.split()
         if len(tokens) == 0:
             continue
+        if search_thread is not None and tokens[0] not in ("isready", "stop", "ponderhit", "quit"):
+            search_thread.join()  # other commands change the engine's state so they wait for the search to finish
+            search_thread = None
         if tokens[0] == "uci":
             send_response(f"id name {NAME} {VERSION}")
             send_response(f"id author {AUTHOR}")
+            send_response("option name Ponder type check default false")
+            send_response(f"option name Hash type spin default {HASH_SIZE} min {MIN_HASH_SIZE} max {MAX_HASH_SIZE}")
+            send_response(f"option name EvalCache type spin default {EVALUATION_CACHE_SIZE} min {MIN_EVALUATION_CACHE_SIZE} max {MAX_EVALUATION_CACHE_SIZE}")
+            send_response(f"option name Threads type spin default {THREAD_COUNT} min 1 max {MAX_THREAD_COUNT}")
+            send_response(f"option name RootSplit type check default {str(ROOT_SPLIT).lower()}")
+            for technique, enabled in SELECTIVE_SEARCH.items():
+                send_response(f"option name {technique} type check default {str(enabled).lower()}")
+            send_response(f"option name Move Overhead type spin default {MOVE_OVERHEAD} min 0 max {MAX_MOVE_OVERHEAD}")
+            send_response(f"option name Stats type check default {str(STATISTICS_ENABLED).lower()}")
+            send_response(f"option name StatsFile type string default {STATISTICS_FILE or '<empty>'}")
+            send_response(f"option name EvalFile type string default {EVALUATION_PARAMETERS_FILE or '<empty>'}")
+            send_response(f"option name PerftBackend type combo default {BOARD_BACKEND} {' '.join(f'var {backend}' for backend in BOARD_BACKENDS)}")
             send_response("uciok")
         elif tokens[0] == "quit":
+            SEARCH_STOP.set()
+            SEARCH_RELEASE.set()
+            if search_thread is not None:
+                search_thread.join()
+            close_transposition_table()
             sys.exit()
+        elif tokens[0] == "stop":
+            SEARCH_STOP.set()  # the search thread sends the best move from the last completed iteration
+            SEARCH_RELEASE.set()
+            if search_thread is not None:
+                search_thread.join()
+                search_thread = None
+        elif tokens[0] == "ponderhit":
+            # The opponent played the expected move, so keep searching but with the normal time budget from now on
+            elapsed: float = time.monotonic() - start_time
+            soft_time_limit, time_limit = elapsed + ponder_time_limits[0], elapsed + ponder_time_limits[1]
+            SEARCH_RELEASE.set()
         elif tokens[0] == "isready":
             if not initialized:
                 initialized = True
-                # Pad the midgame and endgame tables with zeros to make them 10x12
-                for piece in "PNBRQK":
-                    blank_row: list[int] = [0] * 10
-                    new_midgame_table: list[int] = blank_row + blank_row
-                    new_endgame_table: list[int] = blank_row + blank_row
-                    for row in range(0, 64, 8):
-                        new_midgame_table += [0] + MIDGAME_PIECE_SQUARE_TABLES[piece][row:row + 8] + [0]
-                        new_endgame_table += [0] + ENDGAME_PIECE_SQUARE_TABLES[piece][row:row + 8] + [0]
-                    MIDGAME_PIECE_SQUARE_TABLES[piece] = new_midgame_table + blank_row + blank_row
-                    ENDGAME_PIECE_SQUARE_TABLES[piece] = new_endgame_table + blank_row + blank_row
-                # Load opening book data
-                OPENING_BOOKS = [load_book("main" + str(num)) for num in range(1, 8)]  # possible to load each book individually
-                # OPENING_BOOKS = []
-                # Global variable initialization
-                max_depth = 0
-                nodes = 0
-                start_time = 0
-                time_limit = 0
-                timeout = False
+                initialize_engine()
             send_response("readyok")
+        elif tokens[0] == "setoption":  # options are usually sent before "isready" so they are handled before initialization
+            if "name" not in tokens or "value" not in tokens:
+                continue
+            option_name: str = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")]).lower()
+            option_value: str = " ".join(tokens[tokens.index("value") + 1:])
+            if option_name == "perftbackend" and option_value.lower() in BOARD_BACKENDS:
+                BOARD_BACKEND = option_value.lower()
+            elif option_name == "hash" and option_value.isdigit():
+                HASH_SIZE = min(max(int(option_value), MIN_HASH_SIZE), MAX_HASH_SIZE)
+                if initialized:
+                    resize_transposition_table(HASH_SIZE)
+            elif option_name == "evalcache" and option_value.isdigit():
+                EVALUATION_CACHE_SIZE = min(max(int(option_value), MIN_EVALUATION_CACHE_SIZE), MAX_EVALUATION_CACHE_SIZE)
+                if initialized:
+                    resize_evaluation_cache(EVALUATION_CACHE_SIZE)
+                    start_helper_processes()  # the helper and root splitting processes get the new size when restarted
+                    stop_root_split_processes()
+            elif option_name == "threads" and option_value.isdigit():
+                THREAD_COUNT = min(max(int(option_value), 1), MAX_THREAD_COUNT)
+                if initialized:
+                    resize_transposition_table(HASH_SIZE)  # moves the table to shared memory and starts the helpers
+            elif option_name == "rootsplit" and option_value.lower() in ("true", "false"):
+                ROOT_SPLIT = option_value.lower() == "true"
+            elif option_name in (name.lower() for name in SELECTIVE_SEARCH) and option_value.lower() in ("true", "false"):
+                SELECTIVE_SEARCH[next(name for name in SELECTIVE_SEARCH if name.lower() == option_name)] = option_value.lower() == "true"
+            elif option_name == "move overhead" and option_value.isdigit():
+                MOVE_OVERHEAD = min(int(option_value), MAX_MOVE_OVERHEAD)
+            elif option_name == "stats" and option_value.lower() in ("true", "false"):
+                STATISTICS_ENABLED = option_value.lower() == "true"
+                configure_statistics()
+            elif option_name == "statsfile":
+                STATISTICS_FILE = "" if option_value == "<empty>" else option_value
+                configure_statistics()
+            elif option_name == "evalfile":
+                parameters_file: str = "" if option_value == "<empty>" else option_value
+                try:
+                    initialize_evaluation(parameters_file)
+                except (OSError, ValueError) as error:  # keep the parameters in use
+                    send_response(f"info string could not load the evaluation parameters: {error}")
+                    initialize_evaluation(EVALUATION_PARAMETERS_FILE)
+                    continue
+                EVALUATION_PARAMETERS_FILE = parameters_file
+                if initialized:  # scores from the previous parameters are stale
+                    clear_transposition_table()
+                    resize_evaluation_cache(EVALUATION_CACHE_SIZE)
+                    start_helper_processes()  # the helper and root splitting processes load the new parameters when restarted
+                    stop_root_split_processes()
+                    if len(position.board) == 120:
+                        position = position._replace(scores=position_scores(position.board))
         elif not initialized:
             continue  # ignore most commands until the engine is properly initialized with "isready"
+        elif tokens[0] == "ucinewgame":
+            clear_transposition_table()  # forget the previous game
+            clear_move_ordering()
         elif tokens[0] == "position":
             if len(tokens) >= 2 and tokens[1] == "startpos":
-                position = INITIAL_POSITION
-                castling = INITIAL_CASTLING[:]
-                opponent_castling = INITIAL_OPPONENT_CASTLING[:]
-                en_passant = INITIAL_EN_PASSANT
-                king_passant = INITIAL_KING_PASSANT
-                color = INITIAL_COLOR
+                position = Position(INITIAL_BOARD, INITIAL_CASTLING, INITIAL_EN_PASSANT, INITIAL_KING_PASSANT, INITIAL_COLOR, 0, position_scores(INITIAL_BOARD))
+                position = position._replace(key=zobrist_hash(position))
                 REPETITION_TABLE.clear()
             elif len(tokens) >= 8 and tokens[1] == "fen":
                 fen: str = " ".join(tokens[2:8])
-                position, castling, opponent_castling, en_passant, king_passant, color = load_fen(fen)
+                position = load_fen(fen)
                 REPETITION_TABLE.clear()
             if "moves" in tokens:
                 moves_index: int = tokens.index("moves") + 1
@@ -1202,35 +3219,40 @@ def main() -> None:
                         start_square: int = parse_coordinates(move[:2])
                         end_square: int = parse_coordinates(move[2:4])
                         promotion_piece: str = move[4:].upper()
-                        if color == "b":  # if black to move, flip the coordinates
+                        if position.color == "b":  # if black to move, flip the coordinates
                             start_square = 119 - start_square
                             end_square = 119 - end_square
-                        position, castling, opponent_castling, en_passant, king_passant, color = make_move((start_square, end_square, ".", promotion_piece), position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-                        position, castling, opponent_castling, en_passant, king_passant, color = rotate_position(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-                        key: int = zobrist_hash(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-                        if REPETITION_TABLE.get(key) is None:
-                            REPETITION_TABLE[key] = 1
+                        position = rotate_position(make_move((start_square, end_square, ".", promotion_piece), position))
+                        if REPETITION_TABLE.get(position.key) is None:
+                            REPETITION_TABLE[position.key] = 1
                         else:
-                            REPETITION_TABLE[key] += 1
-            king_passant = 0
+                            REPETITION_TABLE[position.key] += 1
+            position = position._replace(king_passant=0)
         elif tokens[0] == "go":
-            if len(position) != 120 or len(castling) != 2 or len(opponent_castling) != 2 or not 0 <= en_passant <= 119 or not 0 <= king_passant <= 119 or color not in ("w", "b"):  # invalid position
+            if len(position.board) != 120 or not 0 <= position.en_passant <= 119 or not 0 <= position.king_passant <= 119 or position.color not in ("w", "b"):  # invalid position
                 continue
             depth: int = 30
             time_limit = 3600  # all times are in seconds
             if "movetime" in tokens:
                 movetime_index: int = tokens.index("movetime") + 1
                 if tokens[movetime_index].isdigit():
-                    time_limit  = int(tokens[movetime_index]) / 1000
+                    time_limit = max((int(tokens[movetime_index]) - MOVE_OVERHEAD) / 1000, MIN_TIME_LIMIT)
+            soft_time_limit = time_limit
             if "depth" in tokens:
                 depth_index: int = tokens.index("depth") + 1
                 if tokens[depth_index].isdigit():
                     depth = int(tokens[depth_index])
+            node_limit = float("inf")
+            if "nodes" in tokens:
+                nodes_index: int = tokens.index("nodes") + 1
+                if tokens[nodes_index].isdigit():
+                    node_limit = int(tokens[nodes_index])
             if "wtime" in tokens or "btime" in tokens or "winc" in tokens or "binc" in tokens:
                 white_time: float = 400  # default values in case not all time controls are specified
                 black_time: float = 400  # these values equate to about 10 seconds of move time
                 white_increment: float = 0
                 black_increment: float = 0
+                moves_to_go: int | None = None
                 if "wtime" in tokens:
                     white_time_index: int = tokens.index("wtime") + 1
                     if tokens[white_time_index].isdigit():
@@ -1247,30 +3269,153 @@ def main() -> None:
                     black_increment_index: int = tokens.index("binc") + 1
                     if tokens[black_increment_index].isdigit():
                         black_increment = int(tokens[black_increment_index]) / 1000
-                if color == 'b':
+                if "movestogo" in tokens:
+                    moves_to_go_index: int = tokens.index("movestogo") + 1
+                    if tokens[moves_to_go_index].isdigit():
+                        moves_to_go = int(tokens[moves_to_go_index])
+                if position.color == 'b':
                     white_time, black_time = black_time, white_time
                     white_increment, black_increment = black_increment, white_increment
-                time_limit = white_time / 20 + white_increment / 2
-            # Technically, we have to be able to recieve the `stop` command at any time but we'd need concurrency to do so
-            best_move: tuple[int, int, str, str] = iteratively_deepen(depth, position, castling[:], opponent_castling[:], en_passant, king_passant, color)
-            send_response(f"bestmove {algebraic_notation(best_move, color)}")
+                soft_time_limit, time_limit = allocate_time(white_time, white_increment, moves_to_go)
+            if "infinite" in tokens or "ponder" in tokens:  # search until "stop" (or "ponderhit") is received
+                ponder_time_limits = (soft_time_limit, time_limit)
+                soft_time_limit = float("inf")
+                time_limit = float("inf")
+                SEARCH_RELEASE.clear()
+            else:
+                SEARCH_RELEASE.set()
+            SEARCH_STOP.clear()
+            # Root splitting only pays off for fixed-depth analysis since it searches more nodes to reach the same depth
+            split_root: bool = ROOT_SPLIT and "depth" in tokens and not any(token in tokens for token in ("wtime", "btime", "winc", "binc", "movetime", "nodes", "infinite", "ponder"))
+            search_thread = threading.Thread(target=search_worker, args=(depth, split_root, position), daemon=True)
+            search_thread.start()
         elif tokens[0] == "eval":
-            score: float = evaluate_position(position, castling[:], opponent_castling[:], en_passant, king_passant, color) / 100
-            if color == "b":
+            score: float = evaluate_position(position) / 100
+            if position.color == "b":
                 score *= -1
             send_response(f"static eval: {'+' if str(score)[0] != '-' else ''}{score}")
         elif tokens[0] == "board":
             if len(tokens) >= 2 and tokens[1] == "unicode":
-                board = display_board(position, castling[:], opponent_castling[:], en_passant, king_passant, color, unicode=True)
+                board = display_board(position, unicode=True)
             else:
-                board = display_board(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
+                board = display_board(position)
             for row in board:
                 send_response(row)
-            send_response(f"FEN: {generate_fen(position, castling[:], opponent_castling[:], en_passant, king_passant, color)}")
-            send_response(f"HASH: {hex(zobrist_hash(position, castling[:], opponent_castling[:], en_passant, king_passant, color)).upper()}")
+            send_response(f"FEN: {generate_fen(position)}")
+            send_response(f"HASH: {hex(position.key).upper()}")
+        elif tokens[0] in ("perft", "divide"):
+            # perft <depth> [cache] [parallel], divide <depth> [cache] [parallel] or perft suite [depth] [cache] [parallel]
+            depth: int = next((int(token) for token in tokens[1:] if token.isdigit()), 3 if "suite" in tokens else 1)
+            jobs: int = (os.cpu_count() or 1) if "parallel" in tokens else 1
+            if tokens[0] == "perft" and "suite" in tokens:
+                lines: list[str] = perft_suite_report(depth, BOARD_BACKEND, "cache" in tokens, jobs)
+            elif len(position.board) == 120:
+                lines: list[str] = perft_report(depth, BOARD_BACKEND, "cache" in tokens, jobs, tokens[0] == "divide", position)
+            else:  # no position set
+                continue
+            for line in lines:
+                send_response(line)
+        elif tokens[0] == "stats":
+            if not STATISTICS_SUMMARY:
+                send_response("no statistics collected, enable the Stats option and search first")
+                continue
+            for name, value in STATISTICS_SUMMARY.items():
+                if name == "iterations":
+                    for iteration in value:
+                        send_response(f"depth {iteration['depth']}: nodes {iteration['nodes']} branching factor {iteration['branching_factor'] or '-'}")
+                else:
+                    send_response(f"{name.replace('_', ' ')}: {value}")
+        elif tokens[0] == "bench":
+            for line in bench(int(tokens[1]) if len(tokens) >= 2 and tokens[1].isdigit() else BENCH_DEPTH):
+                send_response(line)
         elif tokens[0] == "flip":
-            position, castling, opponent_castling, en_passant, king_passant, color = rotate_position(position, castling[:], opponent_castling[:], en_passant, king_passant, color)
+            position = rotate_position(position)
+
+
+def command_line(arguments: list[str]) -> None:
+    """Runs the engine's offline tools from the command line."""
+    global EVALUATION_PARAMETERS_FILE
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog=NAME, description=f"{NAME} {VERSION}, run without arguments to start the UCI loop")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compile_parser: argparse.ArgumentParser = subparsers.add_parser("compile-book", help="merge PolyGlot opening books into a single compiled book")
+    compile_parser.add_argument("books", nargs="*", default=BOOK_NAMES, help=f"names of shipped books or paths to PolyGlot books (default: {' '.join(BOOK_NAMES)})")
+    compile_parser.add_argument("-o", "--output", type=pathlib.Path, default=COMPILED_BOOK_PATH, help="path of the compiled book (default: %(default)s)")
+    analyze_parser: argparse.ArgumentParser = subparsers.add_parser("analyze", help="analyze every position of an EPD or FEN file and write the results as JSON lines")
+    analyze_parser.add_argument("input", type=argparse.FileType("r"), help="EPD or FEN file with one position per line, - for stdin")
+    analyze_parser.add_argument("-o", "--output", type=argparse.FileType("w"), default=sys.stdout, help="JSON lines file for the results (default: stdout)")
+    analyze_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="number of processes (default: %(default)s)")
+    analyze_parser.add_argument("-d", "--depth", type=int, help="search depth (default: 4 unless a time or node limit is given)")
+    analyze_parser.add_argument("-t", "--movetime", type=int, help="search time per position in milliseconds")
+    analyze_parser.add_argument("-n", "--nodes", type=int, help="node limit per position")
+    analyze_parser.add_argument("--hash", type=int, default=HASH_SIZE, help="transposition table size of each process in megabytes (default: %(default)s)")
+    analyze_parser.add_argument("--eval-file", type=pathlib.Path, help="JSON file of tuned evaluation parameters to use (default: the built-in ones)")
+    perft_parser: argparse.ArgumentParser = subparsers.add_parser("perft", help="count the leaf nodes of the legal move tree to verify and time move generation")
+    perft_parser.add_argument("depth", type=int, nargs="?", default=3, help="depth to count (default: %(default)s)")
+    perft_parser.add_argument("-f", "--fen", default=" ".join(PERFT_SUITE[0][0].split()), help="position to count (default: starting position)")
+    perft_parser.add_argument("--divide", action="store_true", help="show the count below each root move")
+    perft_parser.add_argument("--suite", action="store_true", help="check the standard perft positions against their reference counts instead")
+    perft_parser.add_argument("--cache", action="store_true", help="reuse the counts of transposed subtrees")
+    perft_parser.add_argument("-j", "--jobs", type=int, default=1, help="number of processes the root moves are split over (default: %(default)s)")
+    perft_parser.add_argument("-b", "--backend", choices=BOARD_BACKENDS, default=BOARD_BACKEND, help="board representation (default: %(default)s)")
+    bench_parser: argparse.ArgumentParser = subparsers.add_parser("bench", help="search a fixed set of positions and report the total nodes (a signature of the search) and nodes per second")
+    bench_parser.add_argument("depth", type=int, nargs="?", default=BENCH_DEPTH, help="search depth (default: %(default)s)")
+    bench_parser.add_argument("--eval-file", type=pathlib.Path, help="JSON file of tuned evaluation parameters to use (default: the built-in ones)")
+    tune_parser: argparse.ArgumentParser = subparsers.add_parser("tune", help="tune the evaluation parameters on positions labelled with game results (requires NumPy)")
+    tune_parser.add_argument("corpus", type=pathlib.Path, help="file with one FEN or EPD per line followed by its game result")
+    tune_parser.add_argument("-o", "--output", type=pathlib.Path, default=EVALUATION_PARAMETERS_PATH, help="JSON file to write the tuned parameters to (default: %(default)s)")
+    tune_parser.add_argument("--eval-file", type=pathlib.Path, help="JSON file of tuned evaluation parameters to start from (default: the built-in ones)")
+    tune_parser.add_argument("--cache", type=pathlib.Path, help="feature cache, reused while the corpus is unchanged (default: the corpus path with .features.npz appended)")
+    tune_parser.add_argument("-e", "--epochs", type=int, default=TUNING_EPOCHS, help="gradient descent steps (default: %(default)s)")
+    tune_parser.add_argument("-r", "--learning-rate", type=float, default=TUNING_LEARNING_RATE, help="step size in centipawns (default: %(default)s)")
+    args: argparse.Namespace = parser.parse_args(arguments)
+    if getattr(args, "eval_file", None) is not None:
+        try:
+            load_evaluation_parameters(args.eval_file)  # the engine's processes load it again with initialize_evaluation()
+        except (OSError, ValueError) as error:
+            parser.error(f"could not load the evaluation parameters: {error}")
+        EVALUATION_PARAMETERS_FILE = str(args.eval_file)
+    if args.command == "compile-book":
+        entry_count: int = compile_book(args.books, args.output)
+        print(f"wrote {entry_count} entries from {len(args.books)} books to {args.output}")
+    elif args.command == "analyze":
+        depth: int = args.depth if args.depth is not None else (30 if args.movetime is not None or args.nodes is not None else 4)
+        analysis_start: float = time.time()
+        position_count: int = analyze_positions(args.input, args.output, max(1, args.jobs), depth, args.movetime, args.nodes, args.hash)
+        print(f"analyzed {position_count} positions in {time.time() - analysis_start:.1f} seconds", file=sys.stderr)
+    elif args.command == "bench":
+        initialize_engine()
+        print("\n".join(bench(args.depth)))
+    elif args.command == "perft":
+        initialize_engine()
+        if args.suite:
+            lines: list[str] = perft_suite_report(args.depth, args.backend, args.cache, args.jobs)
+        else:
+            lines: list[str] = perft_report(args.depth, args.backend, args.cache, args.jobs, args.divide, load_fen(args.fen))
+        print("\n".join(lines))
+        if args.suite and not lines[-1].startswith(f"passed {len(PERFT_SUITE)}/"):
+            sys.exit(1)
+    elif args.command == "tune":
+        if numpy is None:
+            parser.error("tune requires NumPy")
+        cache_path: pathlib.Path = args.cache or args.corpus.with_name(args.corpus.name + ".features.npz")
+        tuning_start: float = time.time()
+        if feature_cache_valid(args.corpus, cache_path):
+            print(f"reusing the features in {cache_path}", file=sys.stderr)
+        else:
+            position_count: int = extract_tuning_features(args.corpus, cache_path)
+            print(f"extracted the features of {position_count} positions to {cache_path} in {time.time() - tuning_start:.1f} seconds", file=sys.stderr)
+        model: tuple[numpy.ndarray, ...] = load_tuning_model(cache_path)
+        parameters: numpy.ndarray = initial_tuning_parameters()
+        scaling: float = fit_scaling(parameters, model)
+        print(f"scaling {scaling:.4f}", file=sys.stderr)
+        parameters = tune_parameters(parameters, model, scaling, args.epochs, args.learning_rate, lambda epoch, loss: print(f"epoch {epoch} loss {loss:.6f}", file=sys.stderr))
+        loss: float = tuning_loss(parameters, model, scaling)[0]
+        write_evaluation_parameters(parameters, args.output, f"{args.corpus.name} ({len(model[-1])} positions, loss {loss:.6f} with scaling {scaling:.4f})")
+        print(f"wrote the tuned parameters to {args.output} in {time.time() - tuning_start:.1f} seconds (loss {loss:.6f})")
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1:
+        command_line(sys.argv[1:])
+    else:
+        main()
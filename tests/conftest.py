@@ -0,0 +1,13 @@
+"""Makes the engine importable from src/ and sets up the tables it needs, like the helper processes do."""
+
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+
+import simPLY_chess  # noqa: E402
+
+simPLY_chess.initialize_evaluation()
+simPLY_chess.resize_transposition_table(1)
+simPLY_chess.resize_evaluation_cache(1)
+simPLY_chess.reset_search_state()
@@ -0,0 +1,28 @@
+"""Position helpers shared by the tests."""
+
+import random
+
+import simPLY_chess as engine
+
+
+def legal_moves(position: engine.Position) -> list[tuple[tuple[int, int, str, str], engine.Position]]:
+    """Returns every legal move of a position along with the (rotated) position after it."""
+    moves: list[tuple[tuple[int, int, str, str], engine.Position]] = []
+    for move in engine.generate_moves(position):
+        new_position: engine.Position = engine.rotate_position(engine.make_move(move, position))
+        if not engine.king_in_check(new_position.board, new_position.king_passant):
+            moves.append((move, new_position))
+    return moves
+
+
+def random_walk(fen: str, length: int, seed: int) -> list[engine.Position]:
+    """Plays random legal moves from a position, starting over from it when a game ends, and returns every position
+    reached."""
+    generator: random.Random = random.Random(seed)
+    position: engine.Position = engine.load_fen(fen)
+    positions: list[engine.Position] = [position]
+    while len(positions) < length:
+        moves: list[tuple[tuple[int, int, str, str], engine.Position]] = legal_moves(position)
+        position = generator.choice(moves)[1] if moves else engine.load_fen(fen)
+        positions.append(position)
+    return positions
@@ -0,0 +1,32 @@
+"""Batch evaluation with NumPy against the scalar evaluation."""
+
+import pytest
+
+import simPLY_chess as engine
+from helpers import random_walk
+
+numpy = pytest.importorskip("numpy")
+
+
+def walk_fens() -> list[str]:
+    return [engine.generate_fen(position) for fen, _ in engine.PERFT_SUITE for position in random_walk(fen, 200, 1)]
+
+
+def test_evaluate_batch_matches_full_evaluation() -> None:
+    fens: list[str] = walk_fens()
+    expected: list[int] = [engine.full_evaluation(engine.load_fen(fen)) for fen in fens]
+    assert engine.evaluate_batch(fens).tolist() == expected
+
+
+def test_evaluate_encoded_matches_evaluate_batch() -> None:
+    fens: list[str] = walk_fens()
+    assert engine.evaluate_encoded(engine.encode_positions(fens)[0]).tolist() == engine.evaluate_batch(fens).tolist()
+
+
+def test_evaluate_batch_empty() -> None:
+    assert engine.evaluate_batch([]).tolist() == []
+
+
+def test_missing_king() -> None:
+    fens: list[str] = ["8/8/8/4k3/8/8/8/R7 w - - 0 1", "4k3/8/8/8/8/8/8/4K2R b K - 0 1"]
+    assert engine.evaluate_batch(fens).tolist() == [engine.full_evaluation(engine.load_fen(fen)) for fen in fens]
@@ -0,0 +1,23 @@
+"""The Zobrist key and scores make_move() and rotate_position() keep up to date against a full recomputation."""
+
+import pytest
+
+import simPLY_chess as engine
+from helpers import random_walk
+
+WALK_LENGTH: int = 300
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("fen", [fen for fen, _ in engine.PERFT_SUITE])
+def test_random_walk(fen: str, seed: int) -> None:
+    for position in random_walk(fen, WALK_LENGTH, seed):
+        assert position.key == engine.zobrist_hash(position), engine.generate_fen(position)
+        assert position.scores == engine.position_scores(position.board), engine.generate_fen(position)
+
+
+def test_fen_round_trip() -> None:
+    for position in random_walk(engine.PERFT_SUITE[1][0], WALK_LENGTH, 0):
+        reloaded: engine.Position = engine.load_fen(engine.generate_fen(position))
+        assert reloaded.board == position.board
+        assert reloaded.key == position.key
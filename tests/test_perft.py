@@ -0,0 +1,26 @@
+"""Move generation checked against the reference perft counts of the standard suite, for both backends."""
+
+import pytest
+
+import simPLY_chess as engine
+
+PERFT_DEPTH: int = 3
+
+
+@pytest.mark.parametrize("backend", engine.BOARD_BACKENDS)
+@pytest.mark.parametrize("fen, reference_counts", engine.PERFT_SUITE)
+def test_perft_suite(fen: str, reference_counts: list[int], backend: str) -> None:
+    counts: list[tuple[str, int]] = engine.divide(PERFT_DEPTH, backend, False, 1, engine.load_fen(fen))
+    assert sum(count for _, count in counts) == reference_counts[PERFT_DEPTH - 1]
+
+
+@pytest.mark.parametrize("fen, reference_counts", engine.PERFT_SUITE)
+def test_perft_cache(fen: str, reference_counts: list[int]) -> None:
+    cache: dict[tuple[int, int], int] = {}
+    assert engine.perft(PERFT_DEPTH, engine.load_fen(fen), cache) == reference_counts[PERFT_DEPTH - 1]
+
+
+def test_backends_agree_on_root_moves() -> None:
+    for fen, _ in engine.PERFT_SUITE:
+        position: engine.Position = engine.load_fen(fen)
+        assert sorted(notation for notation, _ in engine.perft_root("string", position)) == sorted(notation for notation, _ in engine.perft_root("bitboard", position))
@@ -0,0 +1,32 @@
+"""Static exchange evaluation on known positions."""
+
+import pytest
+
+import simPLY_chess as engine
+
+VALUES: dict[str, int] = engine.MIDGAME_PIECE_VALUES
+
+
+def capture(fen: str, notation: str) -> tuple[str, tuple[int, int, str, str]]:
+    """Returns the board of a position and its capture given in long algebraic notation."""
+    position: engine.Position = engine.load_fen(fen)
+    move: tuple[int, int, str, str] = next(move for move in engine.generate_captures(position.board) if engine.algebraic_notation(move, position.color) == notation)
+    return position.board, move
+
+
+@pytest.mark.parametrize("fen, notation, expected", [
+    ("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1", "e1e5", VALUES["P"]),  # undefended pawn
+    ("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1", "d3e5", VALUES["P"] - VALUES["N"]),  # knight lost to the x-rayed defenders
+    ("4k3/8/3p4/4p3/8/8/8/4Q1K1 w - - 0 1", "e1e5", VALUES["P"] - VALUES["Q"]),  # pawn defended by a pawn
+    ("4k3/8/8/3r4/4P3/8/8/4K3 w - - 0 1", "e4d5", VALUES["R"]),  # pawn takes rook
+    ("4k3/8/2n5/3r4/4P3/8/8/3RK3 w - - 0 1", "e4d5", VALUES["R"]),  # recapturing with the knight would lose it to the rook
+    ("3rk3/8/8/3p4/8/8/3R4/3RK3 w - - 0 1", "d2d5", VALUES["P"]),  # the rook behind the capturing one wins the exchange back
+])
+def test_static_exchange(fen: str, notation: str, expected: int) -> None:
+    board, move = capture(fen, notation)
+    assert engine.static_exchange(board, move) == expected
+
+
+def test_losing_capture() -> None:
+    assert engine.losing_capture(*capture("4k3/8/3p4/4p3/8/8/8/4Q1K1 w - - 0 1", "e1e5"))
+    assert not engine.losing_capture(*capture("4k3/8/8/3r4/4P3/8/8/4K3 w - - 0 1", "e4d5"))
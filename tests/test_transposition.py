@@ -0,0 +1,43 @@
+"""Packing of scores, moves and transposition table entries."""
+
+import pytest
+
+import simPLY_chess as engine
+from helpers import legal_moves, random_walk
+
+
+@pytest.mark.parametrize("midgame_score, endgame_score", [(0, 0), (1, -1), (-250, 300), (engine.CHECKMATE_UPPER, -engine.CHECKMATE_UPPER), (-(1 << 30), (1 << 30) - 1)])
+def test_pack_score(midgame_score: int, endgame_score: int) -> None:
+    assert engine.unpack_score(engine.pack_score(midgame_score, endgame_score)) == (midgame_score, endgame_score)
+
+
+def test_packed_scores_add_up() -> None:
+    assert engine.unpack_score(engine.pack_score(-30, 45) + engine.pack_score(12, -60) - engine.pack_score(-5, 5)) == (-13, -20)
+
+
+def test_pack_move() -> None:
+    moves: set[tuple[int, int, str, str]] = {(0, 0, "", "")}
+    for fen, _ in engine.PERFT_SUITE:
+        for position in random_walk(fen, 100, 2):
+            moves.update(move for move, _ in legal_moves(position))
+    assert any(move[3] != "" for move in moves)  # promotions are covered
+    for move in moves:
+        assert engine.unpack_move(engine.pack_move(move)) == move
+
+
+@pytest.mark.parametrize("depth, score, bound", [(1, 0, engine.EXACT_BOUND), (7, -123, engine.LOWER_BOUND), (255, engine.CHECKMATE_UPPER, engine.UPPER_BOUND), (0, -engine.CHECKMATE_UPPER, engine.EXACT_BOUND)])
+def test_transposition_round_trip(depth: int, score: int, bound: int) -> None:
+    engine.clear_transposition_table()
+    position: engine.Position = engine.load_fen(engine.PERFT_SUITE[1][0])
+    move: tuple[int, int, str, str] = legal_moves(position)[0][0]
+    engine.transposition_store(position.key, move, depth, score, bound)
+    assert engine.transposition_lookup(position.key) == (move, depth, score, bound)
+    assert engine.transposition_lookup(position.key ^ 1) is None
+
+
+def test_transposition_cutoff() -> None:
+    assert engine.transposition_cutoff(50, engine.EXACT_BOUND, -100, 100) == 50
+    assert engine.transposition_cutoff(150, engine.LOWER_BOUND, -100, 100) == 100
+    assert engine.transposition_cutoff(50, engine.LOWER_BOUND, -100, 100) is None
+    assert engine.transposition_cutoff(-150, engine.UPPER_BOUND, -100, 100) == -100
+    assert engine.transposition_cutoff(-50, engine.UPPER_BOUND, -100, 100) is None